@@ -0,0 +1,75 @@
+"""
+Compiled audio kernels for the video chat application.
+
+The kernels need the optional numba package; when it is not installed they
+are None and callers fall back to their numpy implementations.
+"""
+
+import numpy as np
+
+try:
+    from numba import njit
+except ImportError:
+    njit = None
+
+
+if njit is not None:
+    @njit(cache=True, fastmath=True)
+    def resample_remix(src, ratio, dst):
+        """
+        Resample and remix audio in a single pass.
+
+        Each output frame is linearly interpolated from the two nearest source
+        frames and mapped to the output channel layout: equal channel counts
+        are copied, mono is duplicated to every output channel, and other
+        layouts are averaged and the mix written to every output channel.
+
+        Args:
+            src: Source audio as a (frames, channels) array
+            ratio: Source sample rate divided by the output sample rate
+            dst: Output array of shape (output_frames, output_channels)
+        """
+        last = src.shape[0] - 1
+        in_channels = src.shape[1]
+        out_channels = dst.shape[1]
+
+        for i in range(dst.shape[0]):
+            position = i * ratio
+            left = min(int(position), last)
+            right = min(left + 1, last)
+            frac = position - left
+
+            if in_channels == out_channels:
+                for c in range(out_channels):
+                    start = float(src[left, c])
+                    dst[i, c] = start + (float(src[right, c]) - start) * frac
+            elif in_channels == 1:
+                start = float(src[left, 0])
+                value = start + (float(src[right, 0]) - start) * frac
+                for c in range(out_channels):
+                    dst[i, c] = value
+            else:
+                total = 0.0
+                for c in range(in_channels):
+                    start = float(src[left, c])
+                    total += start + (float(src[right, c]) - start) * frac
+                mix = total / in_channels
+                for c in range(out_channels):
+                    dst[i, c] = mix
+else:
+    resample_remix = None
+
+
+def precompile(dtype=np.int16):
+    """
+    Compile the kernels ahead of their first real use.
+
+    Compiling happens on the first call (or loads from numba's cache), so
+    running this at startup keeps that delay off the first received audio.
+
+    Args:
+        dtype: Sample format the kernels will be called with
+    """
+    if resample_remix is not None:
+        resample_remix(np.zeros((8, 1), dtype=dtype), 1.0,
+                       np.zeros((8, 1), dtype=dtype))
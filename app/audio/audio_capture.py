@@ -5,10 +5,22 @@ Audio capture module for the video chat application.
 import threading
 import time
 import logging
-import queue
 import numpy as np
 import sounddevice as sd
 
+from app.audio.devices import default_device, query_devices
+from app.audio.ring_buffer import BlockRing
+
+try:
+    import rtmixer
+except ImportError:
+    # Optional: without rtmixer the stream runs a Python callback
+    rtmixer = None
+
+
+# Size of the rtmixer ring buffer in frames (must be a power of two)
+_RTMIXER_RING_FRAMES = 2 ** 14
+
 
 class AudioCapture:
     """
@@ -16,7 +28,8 @@ class AudioCapture:
     """
     
     def __init__(self, callback=None, sample_rate=44100, channels=1, 
-                 chunk_size=1024, device_id=None):
+                 chunk_size=1024, device_id=None, dtype='int16', defer=False,
+                 latency='low', host_api=None, raw=False):
         """
         Initialize the audio capture.
         
@@ -26,23 +39,60 @@ class AudioCapture:
             channels: Number of audio channels (default: 1 for mono)
             chunk_size: Number of frames per buffer (default: 1024)
             device_id: Audio device ID (default: None for system default)
+            dtype: Sample format delivered to the callback (default: 'int16',
+                   half the bandwidth of 'float32')
+            defer: If True, blocks are handed to a processing thread which
+                   calls the callback. If False (default), the callback is
+                   called directly on the realtime audio thread, so it must
+                   be fast, avoid allocating, and copy the block if it keeps
+                   it. Recording through rtmixer always defers.
+            latency: Latency requested from PortAudio, 'low', 'high' or
+                     seconds (default: 'low')
+            host_api: Host API whose default device is used when device_id
+                      is None, by index or name such as 'WASAPI' or 'ALSA'
+                      (default: None for the system default)
+            raw: If True, the callback gets each block as a memoryview of
+                 interleaved sample bytes instead of a numpy array, read
+                 straight from the stream buffer. Like the array, it is
+                 only valid until the callback returns.
         """
         self.callback = callback
         self.sample_rate = sample_rate
         self.channels = channels
         self.chunk_size = chunk_size
         self.device_id = device_id
+        self.dtype = np.dtype(dtype)
+        self.defer = defer
+        self.latency = latency
+        self.host_api = host_api
+        self.raw = raw
         
         self.is_running = False
         self.stream = None
         self.audio_thread = None
         self.frame_number = 0
         
-        # Queue for audio data
-        self.audio_queue = queue.Queue(maxsize=100)
+        # Ring of preallocated blocks shared with the PortAudio callback,
+        # allocated by start() so the callback itself never allocates
+        self.audio_ring = None
+        self.dropped_frames = 0
+        self._reported_drops = 0
+        
+        # rtmixer state, used instead of the block ring when available
+        self._rt_ring = None
+        self._rt_action = None
+        self._rt_block = None
+        self._rt_out = None
+        
+        # Set by the audio callback whenever a block is pushed
+        self._has_data = threading.Event()
+        
+        # How long the processing thread waits when the ring is empty
+        # (rtmixer has no Python callback to signal it)
+        self._poll_interval = chunk_size / sample_rate / 2
         
         # Get available devices
-        self.devices = sd.query_devices()
+        self.devices = query_devices()
         
     def start(self):
         """
@@ -58,20 +108,70 @@ class AudioCapture:
             self.is_running = True
             self.frame_number = 0
             
-            # Start the audio stream
-            self.stream = sd.InputStream(
-                samplerate=self.sample_rate,
-                channels=self.channels,
-                callback=self._audio_callback,
-                blocksize=self.chunk_size,
-                device=self.device_id
-            )
-            self.stream.start()
-            
-            # Start the processing thread
-            self.audio_thread = threading.Thread(target=self._process_audio)
-            self.audio_thread.daemon = True
-            self.audio_thread.start()
+            # Fall back to the chosen host API's default device
+            device = self.device_id
+            if device is None and self.host_api is not None:
+                device = default_device(self.host_api, 'input')
+            
+            if rtmixer is not None:
+                # Record through rtmixer's C callback into a C ring buffer,
+                # so no Python code runs on the realtime audio thread
+                self.stream = rtmixer.Recorder(
+                    samplerate=self.sample_rate,
+                    channels=self.channels,
+                    blocksize=self.chunk_size,
+                    device=device,
+                    latency=self.latency
+                )
+                self._rt_ring = rtmixer.RingBuffer(
+                    elementsize=self.channels * 4,
+                    size=_RTMIXER_RING_FRAMES
+                )
+                self._rt_block = np.empty((self.chunk_size, self.channels),
+                                          dtype=np.float32)
+                if self.dtype.kind == 'i':
+                    # rtmixer only records float32, so convert on read
+                    self._rt_out = np.empty_like(self._rt_block,
+                                                 dtype=self.dtype)
+                else:
+                    self._rt_out = None
+                self.stream.start()
+                self._rt_action = self.stream.record_ringbuffer(self._rt_ring)
+            else:
+                # Allocate the block pool once for the current stream shape
+                if self.defer and (
+                        self.audio_ring is None
+                        or self.audio_ring.block_frames != self.chunk_size
+                        or self.audio_ring.channels != self.channels
+                        or self.audio_ring.dtype != self.dtype):
+                    self.audio_ring = BlockRing(self.chunk_size, self.channels,
+                                                dtype=self.dtype)
+                
+                # Start the audio stream; a raw stream hands the callback a
+                # plain buffer, so no ndarray is built for every block when
+                # deferring (it is copied straight into the ring) or when the
+                # callback asked for bytes anyway
+                if self.defer or self.raw:
+                    stream_class = sd.RawInputStream
+                else:
+                    stream_class = sd.InputStream
+                self.stream = stream_class(
+                    samplerate=self.sample_rate,
+                    channels=self.channels,
+                    callback=self._make_audio_callback(),
+                    blocksize=self.chunk_size,
+                    device=device,
+                    dtype=self.dtype.name,
+                    latency=self.latency
+                )
+                self.stream.start()
+            
+            # Start the processing thread unless the audio callback calls
+            # the callback itself
+            if self.defer or self._rt_ring is not None:
+                self.audio_thread = threading.Thread(target=self._process_audio)
+                self.audio_thread.daemon = True
+                self.audio_thread.start()
             
             return True
         except Exception as e:
@@ -91,66 +191,171 @@ class AudioCapture:
             
         self.is_running = False
         
+        if self.audio_thread:
+            # Wait for the thread to finish before tearing down the stream
+            # it reads from
+            self.audio_thread.join(timeout=1.0)
+            self.audio_thread = None
+            
         if self.stream:
             self.stream.stop()
             self.stream.close()
             self.stream = None
             
-        if self.audio_thread:
-            # Wait for the thread to finish
-            self.audio_thread.join(timeout=1.0)
-            self.audio_thread = None
+        self._rt_ring = None
+        self._rt_action = None
             
-        # Clear the queue
-        while not self.audio_queue.empty():
-            try:
-                self.audio_queue.get_nowait()
-            except queue.Empty:
-                break
+        # Clear the ring
+        if self.audio_ring is not None:
+            self.audio_ring.clear()
                 
         return True
         
-    def _audio_callback(self, indata, frames, time_info, status):
+    def _make_audio_callback(self):
         """
-        Callback function for the audio stream.
+        Build the callback function for the audio stream.
         
-        Args:
-            indata: Input audio data
-            frames: Number of frames
-            time_info: Time information
-            status: Status information
+        The settings, ring methods and user callback are bound to local
+        names once here, so the callback doesn't look them up on every block.
+        
+        Returns:
+            function: Callback for sd.InputStream
         """
-        if status:
-            logging.warning(f"Audio callback status: {status}")
+        callback = self.callback
+        sample_rate = self.sample_rate
+        channels = self.channels
+        warning = logging.warning
+        error = logging.error
+        
+        if not self.defer:
+            raw = self.raw
             
-        # Add the audio data to the queue
-        try:
-            self.audio_queue.put_nowait(indata.copy())
-        except queue.Full:
-            logging.warning("Audio queue is full, dropping frame")
+            def audio_callback(indata, frames, time_info, status):
+                """
+                Callback function for the audio stream.
+                
+                Args:
+                    indata: Input audio data, or a raw buffer in raw mode
+                    frames: Number of frames
+                    time_info: Time information
+                    status: Status information
+                """
+                if status:
+                    warning(f"Audio callback status: {status}")
+                    
+                # Call the callback directly, skipping the thread hop
+                self.frame_number += 1
+                if callback:
+                    try:
+                        if raw:
+                            indata = memoryview(indata)
+                        callback(indata, sample_rate, channels,
+                                 self.frame_number)
+                    except Exception as e:
+                        error(f"Error processing audio: {e}")
+                        
+            return audio_callback
             
+        push = self.audio_ring.push_bytes
+        has_data = self._has_data
+        
+        def audio_callback(indata, frames, time_info, status):
+            """
+            Callback function for the audio stream.
+            
+            Args:
+                indata: Raw input buffer of interleaved samples
+                frames: Number of frames
+                time_info: Time information
+                status: Status information
+            """
+            if status:
+                warning(f"Audio callback status: {status}")
+                
+            # Copy the audio data into the next free slot of the ring; drops
+            # are only counted here and reported from the processing thread
+            if not push(indata):
+                self.dropped_frames += 1
+            elif not has_data.is_set():
+                # Wake the processing thread
+                has_data.set()
+                
+        return audio_callback
+        
     def _process_audio(self):
         """
-        Process audio data from the queue.
+        Process audio data from the ring.
         """
         while self.is_running:
-            try:
-                # Get audio data from the queue
-                audio_data = self.audio_queue.get(timeout=0.1)
+            if self.dropped_frames != self._reported_drops:
+                logging.warning(
+                    f"Audio ring is full, dropped "
+                    f"{self.dropped_frames - self._reported_drops} frame(s)"
+                )
+                self._reported_drops = self.dropped_frames
+                
+            # Get the oldest audio block
+            audio_data = self._read_block()
+            if audio_data is None:
+                # No audio data available, wait for the next block; the ring
+                # is checked again after clearing so a wakeup can't be lost
+                self._has_data.wait(self._poll_interval)
+                self._has_data.clear()
+                continue
                 
+            try:
                 # Increment frame number
                 self.frame_number += 1
                 
                 # Call the callback if provided
                 if self.callback:
+                    if self.raw:
+                        audio_data = memoryview(audio_data).cast('B')
                     self.callback(audio_data, self.sample_rate, self.channels, 
                                  self.frame_number)
                     
-            except queue.Empty:
-                # No audio data available, just continue
-                continue
             except Exception as e:
                 logging.error(f"Error processing audio: {e}")
+            finally:
+                # Release the block back to the audio callback
+                self._release_block()
+                
+    def _read_block(self):
+        """
+        Get the next captured block from whichever ring the stream fills.
+        
+        Returns:
+            numpy.ndarray or None: The next block, or None if none is ready
+        """
+        if self._rt_ring is None:
+            return self.audio_ring.peek()
+            
+        if self._rt_action not in self.stream.actions:
+            # rtmixer stops recording once its ring buffer fills up
+            logging.warning("Audio ring buffer overflowed, restarting recording")
+            self._rt_ring.flush()
+            self._rt_action = self.stream.record_ringbuffer(self._rt_ring)
+            return None
+            
+        if self._rt_ring.read_available < self.chunk_size:
+            return None
+            
+        self._rt_ring.readinto(self._rt_block)
+        if self._rt_out is None:
+            return self._rt_block
+            
+        # Scale full-range float samples to the integer capture format
+        np.clip(self._rt_block, -1.0, 1.0, out=self._rt_block)
+        np.multiply(self._rt_block, np.iinfo(self.dtype).max,
+                    out=self._rt_out, casting='unsafe')
+        return self._rt_out
+        
+    def _release_block(self):
+        """
+        Release the block returned by _read_block().
+        """
+        if self._rt_ring is None:
+            self.audio_ring.advance()
                 
     def get_devices(self):
         """
@@ -161,6 +366,33 @@ class AudioCapture:
         """
         return self.devices
         
+    def set_input_device(self, device_id):
+        """
+        Set the input device.
+        
+        The stream is reopened on the new device if capture is running; the
+        callback and the block ring are kept.
+        
+        Args:
+            device_id: Device ID to use
+            
+        Returns:
+            bool: True if successful, False otherwise
+        """
+        # Stop the current stream
+        was_running = self.is_running
+        if was_running:
+            self.stop()
+            
+        # Set the new device ID
+        self.device_id = device_id
+        
+        # Restart if it was running
+        if was_running:
+            return self.start()
+            
+        return True
+        
     def is_active(self):
         """
         Check if the audio capture is active.
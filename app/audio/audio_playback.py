@@ -4,42 +4,80 @@ Audio playback module for the video chat application.
 
 import threading
 import logging
-import queue
 import numpy as np
 import sounddevice as sd
 
+from app.audio._fastpath import resample_remix
+from app.audio.devices import default_device, query_devices
+from app.audio.ring_buffer import SampleRing
+
+try:
+    import rtmixer
+except ImportError:
+    # Optional: without rtmixer the stream runs a Python callback
+    rtmixer = None
+
+try:
+    import soxr
+except ImportError:
+    # Optional: without soxr audio is resampled with numpy
+    soxr = None
+
+
+# Size of the rtmixer ring buffer in frames (must be a power of two)
+_RTMIXER_RING_FRAMES = 2 ** 14
+
 
 class AudioPlayback:
     """
     Handles audio playback for received audio frames.
     """
     
-    def __init__(self, sample_rate=44100, channels=1, device_id=None):
+    def __init__(self, sample_rate=44100, channels=1, chunk_size=1024,
+                 device_id=None, dtype='int16', latency='low', host_api=None):
         """
         Initialize the audio playback.
         
         Args:
             sample_rate: Sample rate in Hz (default: 44100)
             channels: Number of channels (default: 1 for mono)
+            chunk_size: Number of frames per buffer (default: 1024)
             device_id: Audio device ID (default: None for system default)
+            dtype: Sample format of the played audio (default: 'int16')
+            latency: Latency requested from PortAudio, 'low', 'high' or
+                     seconds (default: 'low')
+            host_api: Host API whose default device is used when device_id
+                      is None, by index or name such as 'WASAPI' or 'ALSA'
+                      (default: None for the system default)
         """
         self.sample_rate = sample_rate
         self.channels = channels
+        self.chunk_size = chunk_size
         self.device_id = device_id
+        self.dtype = np.dtype(dtype)
+        self.latency = latency
+        self.host_api = host_api
         self.volume = 1.0  # Default to full volume
         
         self.is_running = False
         self.stream = None
         
-        # Queue for audio data
-        self.audio_queue = queue.Queue(maxsize=100)
+        # Ring of contiguous samples shared with the PortAudio callback,
+        # holding at least 64 blocks so network jitter doesn't overflow it
+        self.audio_ring = SampleRing(1 << (chunk_size * 64 - 1).bit_length(),
+                                     channels, dtype=self.dtype)
+        
+        # rtmixer state, used instead of the block ring when available
+        self._rt_ring = None
+        self._rt_action = None
         
-        # Get available devices
-        self.devices = sd.query_devices()
-        self.output_devices = [
-            (i, d['name']) for i, d in enumerate(self.devices) 
-            if d.get('max_output_channels', 0) > 0
-        ]
+        # Streaming soxr resampler and the (rate, channels) it was built for
+        self._resampler = None
+        self._resampler_key = None
+        
+        # Get available devices; output devices are filtered on first use
+        self.devices = query_devices()
+        self.output_devices = None
         
     def start(self):
         """
@@ -54,13 +92,37 @@ class AudioPlayback:
         try:
             self.is_running = True
             
-            # Start the audio stream
-            self.stream = sd.OutputStream(
-                samplerate=self.sample_rate,
-                channels=self.channels,
-                callback=self._audio_callback,
-                device=self.device_id
-            )
+            # Fall back to the chosen host API's default device
+            device = self.device_id
+            if device is None and self.host_api is not None:
+                device = default_device(self.host_api, 'output')
+            
+            if rtmixer is not None:
+                # Play through rtmixer's C callback from a C ring buffer,
+                # so no Python code runs on the realtime audio thread
+                self.stream = rtmixer.Mixer(
+                    samplerate=self.sample_rate,
+                    channels=self.channels,
+                    blocksize=self.chunk_size,
+                    device=device,
+                    latency=self.latency
+                )
+                self._rt_ring = rtmixer.RingBuffer(
+                    elementsize=self.channels * 4,
+                    size=_RTMIXER_RING_FRAMES
+                )
+                self._rt_action = None
+            else:
+                # Start the audio stream
+                self.stream = sd.OutputStream(
+                    samplerate=self.sample_rate,
+                    channels=self.channels,
+                    callback=self._make_audio_callback(),
+                    blocksize=self.chunk_size,
+                    device=device,
+                    dtype=self.dtype.name,
+                    latency=self.latency
+                )
             self.stream.start()
             
             return True
@@ -86,53 +148,53 @@ class AudioPlayback:
             self.stream.close()
             self.stream = None
             
-        # Clear the queue
-        while not self.audio_queue.empty():
-            try:
-                self.audio_queue.get_nowait()
-            except queue.Empty:
-                break
+        self._rt_ring = None
+        self._rt_action = None
+            
+        # Clear the ring
+        self.audio_ring.clear()
                 
         return True
         
-    def _audio_callback(self, outdata, frames, time_info, status):
+    def _make_audio_callback(self):
         """
-        Callback function for the audio stream.
+        Build the callback function for the audio stream.
         
-        Args:
-            outdata: Output audio buffer
-            frames: Number of frames
-            time_info: Time information
-            status: Status information
+        The ring method is bound to a local name once here, so the callback
+        doesn't look it up on every block.
+        
+        Returns:
+            function: Callback for sd.OutputStream
         """
-        if status:
-            logging.warning(f"Audio callback status: {status}")
+        read_into = self.audio_ring.read_into
+        warning = logging.warning
+        
+        def audio_callback(outdata, frames, time_info, status):
+            """
+            Callback function for the audio stream.
             
-        try:
-            # Get audio data from the queue
-            audio_data = self.audio_queue.get_nowait()
-            
-            # Make sure the data is the right shape
-            if audio_data.shape[0] < frames:
-                # Not enough data, pad with zeros
-                padding = np.zeros((frames - audio_data.shape[0], self.channels), 
-                                  dtype=audio_data.dtype)
-                audio_data = np.vstack((audio_data, padding))
-            elif audio_data.shape[0] > frames:
-                # Too much data, truncate
-                audio_data = audio_data[:frames]
+            Args:
+                outdata: Output audio buffer
+                frames: Number of frames
+                time_info: Time information
+                status: Status information
+            """
+            if status:
+                warning(f"Audio callback status: {status}")
                 
-            # Apply volume control if defined
-            if hasattr(self, 'volume'):
-                audio_data = audio_data * self.volume
+            # Copy the oldest frames straight into the output buffer and
+            # scale them in place, so volume changes apply to the next block
+            count = read_into(outdata)
+            volume = self.volume
+            if volume != 1.0:
+                # Volume is within [0, 1], so casting back can't overflow
+                np.multiply(outdata[:count], volume, out=outdata[:count],
+                            casting='unsafe')
+            if count < frames:
+                outdata[count:].fill(0)
                 
-            # Copy the data to the output buffer
-            outdata[:] = audio_data
-            
-        except queue.Empty:
-            # No audio data available, output silence
-            outdata.fill(0)
-            
+        return audio_callback
+        
     def play_audio(self, audio_data, sample_rate, channels):
         """
         Queue audio data for playback.
@@ -149,41 +211,137 @@ class AudioPlayback:
             return False
             
         try:
-            # Convert audio data to numpy array if it's not already
+            # Wrap received bytes in a (frames, channels) array without
+            # copying, dropping any trailing partial frame
             if not isinstance(audio_data, np.ndarray):
-                audio_data = np.frombuffer(audio_data, dtype=np.float32)
-                audio_data = audio_data.reshape(-1, channels)
+                view = memoryview(audio_data).cast('B')
+                frame_bytes = self.dtype.itemsize * channels
+                frames = len(view) // frame_bytes
+                audio_data = np.ndarray((frames, channels), dtype=self.dtype,
+                                        buffer=view[:frames * frame_bytes])
+                
+            # soxr gives the best resampling quality, so it runs first
+            if sample_rate != self.sample_rate and soxr is not None:
+                audio_data = self._resample(audio_data, sample_rate)
+                sample_rate = self.sample_rate
                 
-            # Resample if needed
-            if sample_rate != self.sample_rate:
-                # Simple resampling by linear interpolation
-                # In a real app, you'd use a proper resampling library
-                ratio = self.sample_rate / sample_rate
-                new_length = int(len(audio_data) * ratio)
-                indices = np.arange(new_length) / ratio
-                indices = indices.astype(np.int32)
-                audio_data = audio_data[indices]
+            if resample_remix is not None and (
+                    sample_rate != self.sample_rate or channels != self.channels):
+                # Resample and convert channels in one compiled pass
+                new_length = int(len(audio_data) * self.sample_rate / sample_rate)
+                converted = np.empty((new_length, self.channels), dtype=self.dtype)
+                if new_length and len(audio_data):
+                    resample_remix(audio_data, sample_rate / self.sample_rate,
+                                   converted)
+                audio_data = converted
+            elif sample_rate != self.sample_rate:
+                # Resample if needed
+                audio_data = self._resample(audio_data, sample_rate)
                 
             # Convert channels if needed
-            if channels != self.channels:
+            if resample_remix is None and channels != self.channels:
                 if channels == 1 and self.channels == 2:
-                    # Mono to stereo
-                    audio_data = np.column_stack((audio_data, audio_data))
+                    # Mono to stereo as a broadcast view; the ring copy
+                    # fills both output channels without an extra array
+                    audio_data = np.broadcast_to(audio_data[:, :1],
+                                                 (len(audio_data), 2))
                 elif channels == 2 and self.channels == 1:
-                    # Stereo to mono
-                    audio_data = np.mean(audio_data, axis=1, keepdims=True)
+                    # Stereo to mono by averaging the two channels
+                    mono = np.empty((len(audio_data), 1), dtype=audio_data.dtype)
+                    if mono.dtype.kind == 'f':
+                        np.add(audio_data[:, 0], audio_data[:, 1],
+                               out=mono[:, 0])
+                        mono *= 0.5
+                    else:
+                        # Halve before adding so integer samples can't
+                        # overflow
+                        np.right_shift(audio_data[:, 0], 1, out=mono[:, 0])
+                        mono[:, 0] += audio_data[:, 1] >> 1
+                    audio_data = mono
                     
-            # Add the audio data to the queue
-            self.audio_queue.put_nowait(audio_data)
+            if self._rt_ring is not None:
+                return self._write_rtmixer(audio_data)
+                
+            # Append the audio data to the ring
+            if self.audio_ring.write(audio_data) < len(audio_data):
+                logging.warning("Audio ring is full, dropping frames")
+                return False
             return True
             
-        except queue.Full:
-            logging.warning("Audio queue is full, dropping frame")
-            return False
         except Exception as e:
             logging.error(f"Error queueing audio data: {e}")
             return False
             
+    def _resample(self, audio_data, sample_rate):
+        """
+        Resample audio data to the playback sample rate.
+        
+        Args:
+            audio_data: Audio data as a (frames, channels) numpy array
+            sample_rate: Sample rate of the audio data
+            
+        Returns:
+            numpy.ndarray: Resampled audio data
+        """
+        if soxr is not None:
+            # Keep one streaming resampler per source format so its filter
+            # state carries across chunks instead of restarting every call
+            key = (sample_rate, audio_data.shape[1])
+            if self._resampler_key != key:
+                self._resampler = soxr.ResampleStream(
+                    sample_rate, self.sample_rate, audio_data.shape[1],
+                    dtype=self.dtype.name, quality='QQ'
+                )
+                self._resampler_key = key
+            return self._resampler.resample_chunk(
+                np.ascontiguousarray(audio_data, dtype=self.dtype)
+            )
+            
+        new_length = int(len(audio_data) * self.sample_rate / sample_rate)
+        if new_length == 0 or len(audio_data) == 0:
+            return audio_data[:0]
+            
+        # Linear interpolation between the two nearest source samples
+        positions = (np.arange(new_length, dtype=np.float32)
+                     * np.float32(sample_rate / self.sample_rate))
+        left = positions.astype(np.int64)
+        np.minimum(left, len(audio_data) - 1, out=left)
+        right = np.minimum(left + 1, len(audio_data) - 1)
+        frac = (positions - left).astype(np.float32)[:, None]
+        
+        start = audio_data[left].astype(np.float32, copy=False)
+        resampled = start + (audio_data[right] - start) * frac
+        return resampled.astype(audio_data.dtype, copy=False)
+        
+    def _write_rtmixer(self, audio_data):
+        """
+        Write audio data into the rtmixer ring buffer.
+        
+        Args:
+            audio_data: Audio data as a (frames, channels) numpy array
+            
+        Returns:
+            bool: True if all of the data was queued, False otherwise
+        """
+        # No Python callback runs on this path, so apply the volume here,
+        # scaling integer samples to the float32 format rtmixer plays
+        gain = self.volume
+        if self.dtype.kind == 'i':
+            gain /= np.iinfo(self.dtype).max
+        audio_data = np.ascontiguousarray(audio_data * gain, dtype=np.float32)
+        written = self._rt_ring.write(audio_data)
+        
+        # rtmixer ends playback whenever the ring runs dry, so start it
+        # again once at least one full block is buffered
+        if (self._rt_action not in self.stream.actions
+                and self._rt_ring.read_available >= self.chunk_size):
+            self._rt_action = self.stream.play_ringbuffer(self._rt_ring)
+            
+        if written < len(audio_data):
+            logging.warning("Audio ring buffer is full, dropping frames")
+            return False
+        return True
+        
     def get_output_devices(self):
         """
         Get a list of available output devices.
@@ -191,6 +349,11 @@ class AudioPlayback:
         Returns:
             list: List of (device_id, device_name) tuples
         """
+        if self.output_devices is None:
+            self.output_devices = [
+                (i, d['name']) for i, d in enumerate(self.devices) 
+                if d.get('max_output_channels', 0) > 0
+            ]
         return self.output_devices
         
     def set_output_device(self, device_id):
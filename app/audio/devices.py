@@ -0,0 +1,48 @@
+"""
+Audio device discovery for the video chat application.
+"""
+
+import functools
+import sounddevice as sd
+
+
+@functools.lru_cache(maxsize=1)
+def query_devices():
+    """
+    Get the audio devices known to PortAudio.
+    
+    Enumerating devices queries every host API, so the result is cached and
+    shared by all capture and playback instances.
+    
+    Returns:
+        sounddevice.DeviceList: Available audio devices
+    """
+    return sd.query_devices()
+
+
+def default_device(host_api, kind):
+    """
+    Get the default device of a host API.
+    
+    Args:
+        host_api: Host API index, or a case-insensitive substring of its name
+                  (e.g. 'WASAPI', 'ALSA', 'Core Audio')
+        kind: 'input' or 'output'
+        
+    Returns:
+        int or None: Device ID, or None if the host API has no such device
+        
+    Raises:
+        ValueError: If no host API matches
+    """
+    host_apis = sd.query_hostapis()
+    if isinstance(host_api, int):
+        api = host_apis[host_api]
+    else:
+        matches = [a for a in host_apis if host_api.lower() in a['name'].lower()]
+        if not matches:
+            raise ValueError(f"No host API matching {host_api!r}")
+        api = matches[0]
+        
+    device = api[f'default_{kind}_device']
+    return device if device >= 0 else None
@@ -0,0 +1,209 @@
+"""
+Ring buffers used to hand audio between the PortAudio callback and Python threads.
+"""
+
+import numpy as np
+
+
+class BlockRing:
+    """
+    Single-producer/single-consumer ring of preallocated audio blocks.
+
+    The producer copies each block into the next free slot and advances the
+    head index; the consumer reads the oldest slot and advances the tail index.
+    Each index is only ever written by one side, so neither side takes a lock
+    and the producer never blocks (a full ring simply rejects the block).
+    """
+
+    def __init__(self, block_frames, channels, capacity=64, dtype=np.float32):
+        """
+        Initialize the ring.
+
+        Args:
+            block_frames: Number of frames per slot
+            channels: Number of audio channels per frame
+            capacity: Number of slots, must be a power of two (default: 64)
+            dtype: Sample data type of the slots (default: float32)
+        """
+        if capacity <= 0 or capacity & (capacity - 1):
+            raise ValueError(f"Ring capacity must be a power of two: {capacity}")
+
+        self.block_frames = block_frames
+        self.channels = channels
+        self.dtype = np.dtype(dtype)
+        self.capacity = capacity
+        self._mask = capacity - 1
+
+        # All slots are allocated up front so pushing never allocates
+        self._slots = [
+            np.zeros((block_frames, channels), dtype=dtype)
+            for _ in range(capacity)
+        ]
+        self._lengths = [0] * capacity
+
+        # Flat byte views of the slots for copying raw stream buffers
+        self._byte_slots = [memoryview(slot).cast('B') for slot in self._slots]
+        self._frame_bytes = channels * self.dtype.itemsize
+
+        self._head = 0  # Written by the producer only
+        self._tail = 0  # Written by the consumer only
+
+    def __len__(self):
+        return self._head - self._tail
+
+    def push_bytes(self, data):
+        """
+        Copy raw interleaved samples into the next free slot (producer side).
+
+        This takes any buffer (such as the cffi buffer a raw sounddevice
+        stream passes to its callback) and copies its bytes without wrapping
+        them in a numpy array. Data longer than a slot is truncated to
+        ``block_frames``.
+
+        Args:
+            data: Buffer of samples in the ring's dtype and channel layout
+
+        Returns:
+            bool: True if the data was stored, False if the ring is full
+        """
+        head = self._head
+        if head - self._tail >= self.capacity:
+            return False
+
+        index = head & self._mask
+        view = memoryview(data).cast('B')
+        frames = min(len(view) // self._frame_bytes, self.block_frames)
+        size = frames * self._frame_bytes
+        self._byte_slots[index][:size] = view[:size]
+        self._lengths[index] = frames
+
+        # Publish the slot only once it is fully written
+        self._head = head + 1
+        return True
+
+    def peek(self):
+        """
+        Get the oldest stored block without releasing it (consumer side).
+
+        The returned array is a view into the ring and stays valid until
+        ``advance()`` is called.
+
+        Returns:
+            numpy.ndarray or None: The oldest block, or None if the ring is empty
+        """
+        tail = self._tail
+        if tail == self._head:
+            return None
+
+        index = tail & self._mask
+        return self._slots[index][:self._lengths[index]]
+
+    def advance(self):
+        """
+        Release the block returned by ``peek()`` (consumer side).
+        """
+        if self._tail != self._head:
+            self._tail += 1
+
+    def clear(self):
+        """
+        Drop all stored blocks (consumer side).
+        """
+        self._tail = self._head
+
+
+class SampleRing:
+    """
+    Single-producer/single-consumer ring of contiguous audio samples.
+
+    Unlike BlockRing, writes of any size are packed back to back, so the
+    consumer can take exactly as many frames as it needs regardless of how
+    the producer split them up. Like BlockRing, each index is only written
+    by one side and neither side takes a lock.
+    """
+
+    def __init__(self, capacity, channels, dtype=np.float32):
+        """
+        Initialize the ring.
+
+        Args:
+            capacity: Number of frames held, must be a power of two
+            channels: Number of audio channels per frame
+            dtype: Sample data type (default: float32)
+        """
+        if capacity <= 0 or capacity & (capacity - 1):
+            raise ValueError(f"Ring capacity must be a power of two: {capacity}")
+
+        self.capacity = capacity
+        self.channels = channels
+        self.dtype = np.dtype(dtype)
+        self._mask = capacity - 1
+        self._buffer = np.zeros((capacity, channels), dtype=dtype)
+
+        # Frame counters; the position in the buffer is the counter masked
+        self._head = 0  # Written by the producer only
+        self._tail = 0  # Written by the consumer only
+
+    def __len__(self):
+        return self._head - self._tail
+
+    def write(self, data):
+        """
+        Append frames to the ring (producer side).
+
+        Frames that don't fit are dropped.
+
+        Args:
+            data: Audio data as a (frames, channels) numpy array
+
+        Returns:
+            int: Number of frames written
+        """
+        head = self._head
+        frames = min(len(data), self.capacity - (head - self._tail))
+        if frames <= 0:
+            return 0
+
+        # Copy in up to two parts when the write wraps around the end
+        start = head & self._mask
+        first = min(frames, self.capacity - start)
+        np.copyto(self._buffer[start:start + first], data[:first])
+        if first < frames:
+            np.copyto(self._buffer[:frames - first], data[first:frames])
+
+        # Publish the frames only once they are fully written
+        self._head = head + frames
+        return frames
+
+    def read_into(self, out):
+        """
+        Move the oldest frames into an output array (consumer side).
+
+        Args:
+            out: Array of shape (frames, channels) to fill from the start
+
+        Returns:
+            int: Number of frames copied, less than len(out) if the ring ran
+            short
+        """
+        tail = self._tail
+        frames = min(len(out), self._head - tail)
+        if frames <= 0:
+            return 0
+
+        # Copy out in up to two parts when the read wraps around the end
+        start = tail & self._mask
+        first = min(frames, self.capacity - start)
+        np.copyto(out[:first], self._buffer[start:start + first])
+        if first < frames:
+            np.copyto(out[first:frames], self._buffer[:frames - first])
+
+        # Release the frames back to the producer
+        self._tail = tail + frames
+        return frames
+
+    def clear(self):
+        """
+        Drop all stored frames (consumer side).
+        """
+        self._tail = self._head
@@ -1,14 +1,19 @@
 import customtkinter as ctk
+import atexit
 import threading
 import time
 import logging
 import cv2
 import numpy as np
+from PIL import Image
 
-from app.video.capture import VideoCapture
+from app.video.capture import VideoCapture, resize_interpolation
 from app.video.encoder import VideoEncoder
+from app.video import _fastpath as video_fastpath
+from app.video._fastpath import bgr_resize_rgb, nn_resize
 from app.audio.audio_capture import AudioCapture
 from app.audio.audio_playback import AudioPlayback
+from app.audio import _fastpath as audio_fastpath
 from app.network.connection import Connection
 from app.network.protocol_pb2 import ControlType, StatusType
 
@@ -17,6 +22,31 @@ from app.network.protocol_pb2 import ControlType, StatusType
 ctk.set_appearance_mode("System")  # Modes: System, Dark, Light
 ctk.set_default_color_theme("blue")  # Themes: blue, green, dark-blue
 
+logger = logging.getLogger(__name__)
+
+# Sections of the statistics panel as (title, ((field, label), ...))
+_STATS_LAYOUT = (
+    ("Connection", (
+        ("connected", "Connected"),
+        ("remote_address", "Remote"),
+        ("local_address", "Local"),
+    )),
+    ("Data", (
+        ("bytes_sent", "Sent"),
+        ("bytes_received", "Received"),
+        ("messages_sent", "Messages sent"),
+        ("messages_received", "Messages received"),
+    )),
+    ("Video", (
+        ("local_video", "Local"),
+        ("remote_video", "Remote"),
+    )),
+    ("Audio", (
+        ("local_audio", "Local"),
+        ("remote_audio", "Remote"),
+    )),
+)
+
 
 class MainWindow:
     def __init__(self):
@@ -31,6 +61,12 @@ class MainWindow:
         self.root.grid_rowconfigure(0, weight=1)
         self.root.grid_rowconfigure(1, weight=0)  # Status bar row
         
+        # Shared fonts, so each Tk font is only created once
+        self._font_bold = ctk.CTkFont(weight="bold")
+        self._font_title = ctk.CTkFont(size=20, weight="bold")
+        self._font_header = ctk.CTkFont(size=16)
+        self._font_icon = ctk.CTkFont(size=20)
+        
         # Create the sidebar frame
         self.create_sidebar()
         
@@ -56,12 +92,44 @@ class MainWindow:
         self.video_frame_count = 0
         self.remote_frame = None
         
+        # Display buffers the video callbacks resize into, so no new
+        # frame-sized array is allocated for every displayed frame
+        self._local_disp_buf = np.empty((480, 640, 3), dtype=np.uint8)
+        self._local_disp_size = (640, 480)
+        self._local_ctk_image = None
+        self._last_preview_key = None
+        self._local_widget_size = (0, 0)
+        self._window_mapped = True
+        
+        # Images waiting for the UI thread to show them, by pane
+        self._paint_lock = threading.Lock()
+        self._pending_paint = {}
+        self._paint_scheduled = False
+        self._remote_disp_buf = np.empty((480, 640, 3), dtype=np.uint8)
+        self._remote_ctk_image = None
+        
+        # Convert and resize remote frames in one compiled pass, and scale
+        # the local preview with the compiled nearest-neighbour kernel,
+        # instead of with OpenCV; off by default since OpenCV's SIMD code
+        # is faster wherever it is available
+        self.use_compiled_convert = False
+        
+        # Set when a new local frame should be encoded and sent; the encoder
+        # takes the newest frame from the capture's frame ring, so a slow
+        # encode drops stale frames instead of stalling capture
+        self._encode_event = threading.Event()
+        
         # Audio components
+        # Blocks are handed to the capture's processing thread, since
+        # sending them compresses, allocates and may log, none of which
+        # belongs on the realtime audio thread
         self.audio_capture = AudioCapture(
             callback=self.on_local_audio_frame,
             sample_rate=44100,
             channels=1,
-            chunk_size=1024
+            chunk_size=1024,
+            defer=True,
+            raw=True
         )
         self.audio_frame_count = 0
         
@@ -88,11 +156,34 @@ class MainWindow:
         self.video_enabled = False
         self.audio_enabled = False
         self.remote_video_enabled = False
-        self.remote_audio_enabled = False
+        self._set_remote_audio_enabled(False)
         
         # Statistics
         self.stats_update_interval = 1.0  # seconds
         self.last_stats_update = 0
+        self._last_stats = None
+        self._closing = threading.Event()
+        
+        # Set once on_close has run, so it only cleans up once
+        self._closed = False
+        
+        # Whether the widgets already show the disconnected state
+        self._ui_is_disconnected = True
+        
+        # Latest video/audio state per kind waiting to be sent to the peer
+        self._pending_state = {}
+        self._state_after_id = None
+        
+        # Start the encoder thread once everything it reads exists
+        self._encode_thread = threading.Thread(target=self._encode_worker)
+        self._encode_thread.daemon = True
+        self._encode_thread.start()
+        
+        # Compile the Numba kernels in the background while the user is
+        # still setting up, instead of on the first frame that needs them
+        precompile_thread = threading.Thread(target=self._precompile_kernels)
+        precompile_thread.daemon = True
+        precompile_thread.start()
         
         # Populate device dropdowns
         self.populate_audio_devices()
@@ -102,15 +193,21 @@ class MainWindow:
         """Populate the audio device dropdowns with available devices"""
         # Input devices
         input_devices = self.audio_capture.get_devices()
-        input_device_names = [f"{i}: {d['name']}" for i, d in enumerate(input_devices) 
-                             if d.get('max_input_channels', 0) > 0]
+        self._input_devices = {
+            f"{i}: {d['name']}": i for i, d in enumerate(input_devices)
+            if d.get('max_input_channels', 0) > 0
+        }
+        input_device_names = list(self._input_devices)
         if input_device_names:
             self.input_device_menu.configure(values=input_device_names)
             self.input_device_menu.set(input_device_names[0])
         
         # Output devices
         output_devices = self.audio_playback.get_output_devices()
-        output_device_names = [f"{id}: {name}" for id, name in output_devices]
+        self._output_devices = {
+            f"{id}: {name}": id for id, name in output_devices
+        }
+        output_device_names = list(self._output_devices)
         if output_device_names:
             self.output_device_menu.configure(values=output_device_names)
             self.output_device_menu.set(output_device_names[0])
@@ -119,7 +216,10 @@ class MainWindow:
         """Populate the video device dropdown with available devices"""
         # Get available video devices
         video_devices = self.local_video_capture.get_devices()
-        video_device_names = [f"{i}: {name}" for i, name in enumerate(video_devices)]
+        self._video_devices = {
+            f"{i}: {name}": i for i, name in enumerate(video_devices)
+        }
+        video_device_names = list(self._video_devices)
         
         if video_device_names:
             self.video_device_menu.configure(values=video_device_names)
@@ -130,11 +230,19 @@ class MainWindow:
         # Handle window close
         self.root.protocol("WM_DELETE_WINDOW", self.on_close)
         
-        # Set up periodic tasks
-        self.root.after(
-            int(self.stats_update_interval * 1000), 
-            self.update_statistics
-        )
+        # Also clean up at interpreter exit if the window was never closed,
+        # e.g. after Ctrl+C; on_close does nothing if it already ran
+        atexit.register(self.on_close)
+        
+        # Track the preview size and window state for the capture thread
+        self.local_video.bind("<Configure>", self._on_local_video_configure)
+        self.root.bind("<Map>", self._on_window_map, add="+")
+        self.root.bind("<Unmap>", self._on_window_unmap, add="+")
+        
+        # Gather statistics on a background thread
+        self._stats_thread = threading.Thread(target=self._stats_loop)
+        self._stats_thread.daemon = True
+        self._stats_thread.start()
         
     def create_sidebar(self):
         """Create the sidebar with controls and settings"""
@@ -146,7 +254,7 @@ class MainWindow:
         app_title = ctk.CTkLabel(
             sidebar_frame, 
             text="Video & Audio Settings", 
-            font=ctk.CTkFont(size=20, weight="bold")
+            font=self._font_title
         )
         app_title.grid(row=0, column=0, padx=20, pady=(20, 10))
         
@@ -157,7 +265,7 @@ class MainWindow:
         connection_label = ctk.CTkLabel(
             connection_frame, 
             text="Connection", 
-            font=ctk.CTkFont(weight="bold")
+            font=self._font_bold
         )
         connection_label.grid(row=0, column=0, padx=10, pady=5, sticky="w")
         
@@ -205,7 +313,7 @@ class MainWindow:
         video_label = ctk.CTkLabel(
             video_frame, 
             text="Video Controls", 
-            font=ctk.CTkFont(weight="bold")
+            font=self._font_bold
         )
         video_label.grid(row=0, column=0, padx=10, pady=5, sticky="w")
         
@@ -232,7 +340,7 @@ class MainWindow:
         video_device_label = ctk.CTkLabel(
             video_device_frame, 
             text="Video Devices", 
-            font=ctk.CTkFont(weight="bold")
+            font=self._font_bold
         )
         video_device_label.grid(
             row=0, column=0, padx=10, pady=5, sticky="w"
@@ -263,7 +371,7 @@ class MainWindow:
         audio_device_label = ctk.CTkLabel(
             audio_device_frame, 
             text="Audio Devices", 
-            font=ctk.CTkFont(weight="bold")
+            font=self._font_bold
         )
         audio_device_label.grid(
             row=0, column=0, padx=10, pady=5, sticky="w"
@@ -308,7 +416,7 @@ class MainWindow:
         settings_label = ctk.CTkLabel(
             settings_frame, 
             text="Settings", 
-            font=ctk.CTkFont(weight="bold")
+            font=self._font_bold
         )
         settings_label.grid(row=0, column=0, padx=10, pady=5, sticky="w")
         
@@ -332,16 +440,33 @@ class MainWindow:
         stats_label = ctk.CTkLabel(
             self.stats_frame, 
             text="Statistics", 
-            font=ctk.CTkFont(weight="bold")
+            font=self._font_bold
         )
         stats_label.grid(row=0, column=0, padx=10, pady=5, sticky="w")
         
-        self.stats_text = ctk.CTkTextbox(
-            self.stats_frame,
-            height=150,
-            state="disabled"
-        )
-        self.stats_text.grid(row=1, column=0, padx=10, pady=5, sticky="nsew")
+        # One label per value, each bound to a StringVar so an update only
+        # repaints the labels whose text changed
+        stats_grid = ctk.CTkFrame(self.stats_frame, fg_color="transparent")
+        stats_grid.grid(row=1, column=0, padx=10, pady=5, sticky="nsew")
+        
+        self._stat_vars = {}
+        row = 0
+        for title, fields in _STATS_LAYOUT:
+            section_label = ctk.CTkLabel(stats_grid, text=f"{title}:")
+            section_label.grid(row=row, column=0, columnspan=2, sticky="w")
+            row += 1
+            
+            for field, label in fields:
+                name_label = ctk.CTkLabel(stats_grid, text=f"{label}:")
+                name_label.grid(row=row, column=0, padx=(10, 5), sticky="w")
+                
+                self._stat_vars[field] = ctk.StringVar(value="-")
+                value_label = ctk.CTkLabel(
+                    stats_grid, 
+                    textvariable=self._stat_vars[field]
+                )
+                value_label.grid(row=row, column=1, sticky="w")
+                row += 1
         
     def create_status_bar(self):
         """Create a status bar at the bottom of the window"""
@@ -389,7 +514,7 @@ class MainWindow:
         self.connection_info = ctk.CTkLabel(
             header_frame, 
             text="Not connected", 
-            font=ctk.CTkFont(size=16)
+            font=self._font_header
         )
         self.connection_info.pack(pady=10)
         
@@ -400,7 +525,7 @@ class MainWindow:
         local_label = ctk.CTkLabel(
             local_frame, 
             text="Local Video", 
-            font=ctk.CTkFont(weight="bold")
+            font=self._font_bold
         )
         local_label.pack(pady=5)
         
@@ -414,7 +539,7 @@ class MainWindow:
         remote_label = ctk.CTkLabel(
             remote_frame, 
             text="Remote Video", 
-            font=ctk.CTkFont(weight="bold")
+            font=self._font_bold
         )
         remote_label.pack(pady=5)
         
@@ -440,7 +565,7 @@ class MainWindow:
         local_audio_label = ctk.CTkLabel(
             local_audio_frame, 
             text="Local Audio Controls", 
-            font=ctk.CTkFont(weight="bold")
+            font=self._font_bold
         )
         local_audio_label.grid(row=0, column=0, padx=10, pady=5, sticky="w")
         
@@ -466,7 +591,7 @@ class MainWindow:
         remote_audio_label = ctk.CTkLabel(
             remote_audio_frame, 
             text="Remote Audio Controls", 
-            font=ctk.CTkFont(weight="bold")
+            font=self._font_bold
         )
         remote_audio_label.grid(row=0, column=0, columnspan=2, padx=10, pady=5, sticky="w")
         
@@ -474,7 +599,7 @@ class MainWindow:
         speaker_icon = ctk.CTkLabel(
             remote_audio_frame,
             text="🔊",  # Unicode speaker icon
-            font=ctk.CTkFont(size=20),
+            font=self._font_icon,
             width=30
         )
         speaker_icon.grid(row=1, column=0, padx=(10, 0), pady=5, sticky="w")
@@ -565,6 +690,7 @@ class MainWindow:
         # Start hosting
         if self.connection.host(port):
             self.is_hosting = True
+            self._ui_is_disconnected = False
             self.update_status("Hosting - Waiting for connection", "blue")
             self.connection_info.configure(text=f"Hosting on port {port}")
         else:
@@ -575,15 +701,9 @@ class MainWindow:
     def disconnect(self):
         """Disconnect from the current session"""
         if self.connection.disconnect():
-            self.is_connected = False
-            self.is_hosting = False
-            self.update_status("Disconnected", "gray")
-            self.connection_info.configure(text="Not connected")
-            
-            # Enable connect and host buttons
-            self.connect_button.configure(state="normal")
-            self.host_button.configure(state="normal")
-            self.disconnect_button.configure(state="disabled")
+            # The connection's disconnect callback has usually reset the
+            # UI already, in which case this does nothing
+            self._reset_ui_to_disconnected()
             
             # Turn off camera and mic if they're on
             if self.video_enabled:
@@ -593,11 +713,6 @@ class MainWindow:
             if self.audio_enabled:
                 self.mic_switch.deselect()
                 self.toggle_mic()
-                
-            # Clear remote video
-            self.remote_video.configure(image=None, text="Not Connected")
-            self.remote_video_enabled = False
-            self.remote_audio_enabled = False
         
     def toggle_camera(self):
         """Toggle camera on/off"""
@@ -609,7 +724,7 @@ class MainWindow:
                 
                 # Notify remote peer if connected
                 if self.is_connected:
-                    self.connection.set_video_state(True)
+                    self._queue_state('video', True)
             else:
                 self.update_status("Could not start camera", "red")
                 self.camera_switch.deselect()
@@ -621,7 +736,7 @@ class MainWindow:
             
             # Notify remote peer if connected
             if self.is_connected:
-                self.connection.set_video_state(False)
+                self._queue_state('video', False)
             
     def toggle_mic(self):
         """Toggle microphone on/off"""
@@ -633,7 +748,7 @@ class MainWindow:
                 
                 # Notify remote peer if connected
                 if self.is_connected:
-                    self.connection.set_audio_state(True)
+                    self._queue_state('audio', True)
             else:
                 self.update_status("Could not start microphone", "red")
                 self.mic_switch.deselect()
@@ -644,45 +759,28 @@ class MainWindow:
             
             # Notify remote peer if connected
             if self.is_connected:
-                self.connection.set_audio_state(False)
+                self._queue_state('audio', False)
     
     def change_input_device(self, device_str):
         """Change the input audio device"""
-        if not device_str or ":" not in device_str:
+        # Look up the device ID of the chosen entry
+        device_id = self._input_devices.get(device_str)
+        if device_id is None:
             return
-            
-        # Extract device ID from the string
-        device_id = int(device_str.split(":")[0])
-        
-        # Stop the current capture if it's running
-        was_running = self.audio_enabled
-        if was_running:
-            self.audio_capture.stop()
-            
-        # Create a new audio capture with the selected device
-        self.audio_capture = AudioCapture(
-            callback=self.on_local_audio_frame,
-            sample_rate=44100,
-            channels=1,
-            chunk_size=1024,
-            device_id=device_id
-        )
         
-        # Restart if it was running
-        if was_running:
-            success = self.audio_capture.start()
-            if not success:
-                self.update_status("Failed to start with new device", "red")
-                self.mic_switch.deselect()
-                self.audio_enabled = False
+        # Switch the capture to the new device, restarting it if running
+        success = self.audio_capture.set_input_device(device_id)
+        if not success:
+            self.update_status("Failed to start with new device", "red")
+            self.mic_switch.deselect()
+            self.audio_enabled = False
 
     def change_input_video_device(self, device_str):
         """Change the input video device"""
-        if not device_str or ":" not in device_str:
+        # Look up the device ID of the chosen entry
+        device_id = self._video_devices.get(device_str)
+        if device_id is None:
             return
-            
-        # Extract device ID from the string
-        device_id = int(device_str.split(":")[0])
         
         # Stop the current capture if it's running
         was_running = self.video_enabled
@@ -705,11 +803,10 @@ class MainWindow:
 
     def change_output_device(self, device_str):
         """Change the output audio device"""
-        if not device_str or ":" not in device_str:
+        # Look up the device ID of the chosen entry
+        device_id = self._output_devices.get(device_str)
+        if device_id is None:
             return
-            
-        # Extract device ID from the string
-        device_id = int(device_str.split(":")[0])
         
         # Set the new output device
         success = self.audio_playback.set_output_device(device_id)
@@ -726,44 +823,211 @@ class MainWindow:
             text=f"Status: {message}", 
             text_color=color
         )
-        logging.info(f"Status: {message}")
+        logger.info("Status: %s", message)
         
+    def _precompile_kernels(self):
+        """Compile the Numba kernels this session may use"""
+        # The video kernels are compiled even while use_compiled_convert is
+        # off, since it can be turned on later; numba's cache makes this
+        # cheap after the first run
+        try:
+            audio_fastpath.precompile(self.audio_playback.dtype)
+            video_fastpath.precompile()
+        except Exception as e:
+            logger.warning("Could not precompile kernels: %s", e)
+            
     def on_local_video_frame(self, frame):
         """Callback for updating the local video frame"""
         # Frame is already in RGB format from VideoCapture
-        # Resize for display
-        img = cv2.resize(frame, (640, 480))
+        # Only render the preview when the widget is visible
+        size = self._local_preview_size(frame)
+        if size is not None:
+            width, height = size
+            if size != self._local_disp_size:
+                # The widget was resized, so reallocate the display buffer
+                self._local_disp_buf = np.empty((height, width, 3),
+                                                dtype=np.uint8)
+                self._local_disp_size = size
+                
+            # Resize for display into the preallocated buffer
+            if self.use_compiled_convert and nn_resize is not None:
+                nn_resize(frame, self._local_disp_buf, False)
+            else:
+                cv2.resize(frame, size, dst=self._local_disp_buf,
+                           interpolation=resize_interpolation(frame, size))
             
-        # Convert to PIL Image and then to CTkImage
-        from PIL import Image
-        pil_img = Image.fromarray(img)
-        ctk_image = ctk.CTkImage(
-            light_image=pil_img, 
-            dark_image=pil_img,
-            size=(640, 480)
-        )
-        
-        # Update the local video display
-        self.local_video.configure(image=ctk_image, text="")
-        self.local_video.image = ctk_image
+            # Build a PIL Image from the buffer and have the UI thread
+            # show it
+            pil_img = Image.frombuffer(
+                "RGB", size, self._local_disp_buf, "raw", "RGB", 0, 1
+            )
+            self._post_paint('local', pil_img)
         
-        # Send the frame to the remote peer if connected and video is enabled
+        # Wake the encoder thread if connected and video is enabled; it
+        # takes the BGR frame from the capture's frame ring without copying
+        # or converting it
         if self.is_connected and self.video_enabled:
-            # Encode the frame
-            frame_data, width, height = self.video_encoder.encode_frame(frame)
-            
-            # Increment frame count
-            self.video_frame_count += 1
-            
-            # Send the frame
-            self.connection.send_video_frame(
-                frame_data, 
-                width, 
-                height, 
-                self.video_encoder.encoding,
-                self.video_frame_count
+            self._encode_event.set()
+                
+    def _encode_worker(self):
+        """Encode local frames and send them to the remote peer"""
+        while True:
+            self._encode_event.wait()
+            self._encode_event.clear()
+            if self._closing.is_set():
+                break
+                
+            # Take the newest frame, holding its slot until it is sent
+            frames = self.local_video_capture.frames
+            frame = frames.latest() if frames is not None else None
+            if frame is None:
+                continue
+                
+            try:
+                # Encode the frame
+                frame_data, width, height = self.video_encoder.encode_frame(frame)
+                
+                # Increment frame count
+                self.video_frame_count += 1
+                
+                # Send the frame
+                self.connection.send_video_frame(
+                    frame_data, 
+                    width, 
+                    height, 
+                    self.video_encoder.encoding,
+                    self.video_frame_count
+                )
+            except Exception as e:
+                logger.error("Error encoding video frame: %s", e)
+            finally:
+                frames.release()
+            
+    def _post_paint(self, pane, pil_img):
+        """
+        Queue an image to be shown in a video pane by the UI thread.
+        
+        Tk may only be used from the UI thread, so the video callbacks hand
+        their images over here. If the UI thread falls behind, only the
+        newest image per pane is shown.
+        
+        Args:
+            pane: 'local' or 'remote'
+            pil_img: PIL Image to show
+        """
+        with self._paint_lock:
+            self._pending_paint[pane] = pil_img
+            if self._paint_scheduled:
+                return
+            self._paint_scheduled = True
+            
+        try:
+            self.root.after(0, self._paint)
+        except RuntimeError:
+            # The main loop has already exited
+            pass
+            
+    def _paint(self):
+        """Show the images queued by _post_paint (UI thread only)"""
+        with self._paint_lock:
+            pending, self._pending_paint = self._pending_paint, {}
+            self._paint_scheduled = False
+            
+        if self._closing.is_set():
+            return
+            
+        if 'local' in pending:
+            pil_img = pending['local']
+            scaling = ctk.ScalingTracker.get_widget_scaling(self.local_video)
+            self._local_ctk_image = self._show_image(
+                self.local_video, self._local_ctk_image, pil_img,
+                (pil_img.width / scaling, pil_img.height / scaling)
+            )
+            
+        if 'remote' in pending:
+            self._remote_ctk_image = self._show_image(
+                self.remote_video, self._remote_ctk_image, pending['remote'],
+                (640, 480)
             )
             
+    def _on_local_video_configure(self, event):
+        """Record the size of the local preview widget"""
+        self._local_widget_size = (event.width, event.height)
+        
+    def _on_window_map(self, event):
+        """Record that the window was restored"""
+        if event.widget is self.root:
+            self._window_mapped = True
+            
+    def _on_window_unmap(self, event):
+        """Record that the window was minimized"""
+        if event.widget is self.root:
+            self._window_mapped = False
+            
+    def _show_image(self, label, ctk_image, pil_img, size):
+        """
+        Show an image in a video label, reusing the label's CTkImage.
+        
+        Args:
+            label: CTkLabel to show the image in
+            ctk_image: The label's CTkImage from the last call, or None
+            pil_img: PIL Image to show
+            size: Display size of the image
+            
+        Returns:
+            ctk.CTkImage: The CTkImage now shown, to pass to the next call
+        """
+        if ctk_image is None:
+            ctk_image = ctk.CTkImage(
+                light_image=pil_img, 
+                dark_image=pil_img,
+                size=size
+            )
+        else:
+            # Swap the image in place; the label redraws itself
+            ctk_image.configure(light_image=pil_img, dark_image=pil_img,
+                                size=size)
+            
+        # Attach the image again if the label was cleared in the meantime
+        if label.cget("image") is not ctk_image:
+            label.configure(image=ctk_image, text="")
+        return ctk_image
+        
+    def _local_preview_size(self, frame):
+        """
+        Get the size to render the local preview at.
+        
+        The frame is fitted inside the preview widget keeping its aspect
+        ratio, never larger than 640x480.
+        
+        Args:
+            frame: Video frame to be displayed
+            
+        Returns:
+            tuple: (width, height) in pixels, or None if the widget is too
+            small to show anything or the window is minimized
+        """
+        # The widget state is recorded by Tk event handlers, since this runs
+        # on the capture thread and can't query Tk itself
+        if not self._window_mapped:
+            return None
+            
+        width, height = self._local_widget_size
+        if width < 8 or height < 8:
+            return None
+            
+        key = (width, height, frame.shape[0], frame.shape[1])
+        if key == self._last_preview_key:
+            # Widget and frame unchanged since the last frame
+            return self._local_disp_size
+        self._last_preview_key = key
+        
+        frame_height, frame_width = frame.shape[:2]
+        scale = min(width / frame_width, height / frame_height,
+                    640 / frame_width, 480 / frame_height)
+        return (max(1, int(frame_width * scale)),
+                max(1, int(frame_height * scale)))
+        
     def on_local_audio_frame(self, audio_data, sample_rate, channels, 
                             frame_number):
         """Callback for local audio frames"""
@@ -779,36 +1043,48 @@ class MainWindow:
     def on_remote_video_frame(self, frame_data, width, height, encoding, 
                              frame_number):
         """Callback for remote video frames"""
-        # Decode the frame
+        compiled = self.use_compiled_convert and bgr_resize_rgb is not None
+        
+        # Decode the frame, straight to RGB unless the compiled kernel
+        # converts it while resizing
         frame = self.video_encoder.decode_frame(
             frame_data, 
             width, 
             height, 
-            encoding
+            encoding,
+            out_format='bgr' if compiled else 'rgb'
         )
         
         if frame is not None:
-            # Convert to RGB if needed
-            if frame.shape[2] == 3:  # BGR format
-                frame = cv2.cvtColor(frame, cv2.COLOR_BGR2RGB)
-                
-            # Resize for display
-            frame = cv2.resize(frame, (640, 480))
+            if compiled:
+                # Convert from BGR and resize into the display buffer together
+                bgr_resize_rgb(frame, self._remote_disp_buf)
+            else:
+                # Resize for display into the preallocated buffer
+                cv2.resize(frame, (640, 480), dst=self._remote_disp_buf,
+                           interpolation=resize_interpolation(frame, (640, 480)))
             
-            # Convert to PIL Image and then to CTkImage
-            from PIL import Image
-            pil_img = Image.fromarray(frame)
-            ctk_image = ctk.CTkImage(
-                light_image=pil_img, 
-                dark_image=pil_img,
-                size=(640, 480)
+            # Build a PIL Image from the buffer and have the UI thread
+            # show it
+            pil_img = Image.frombuffer(
+                "RGB", (640, 480), self._remote_disp_buf, "raw", "RGB", 0, 1
             )
-            
-            # Update the remote video display
-            self.remote_video.configure(image=ctk_image, text="")
-            self.remote_video.image = ctk_image
+            self._post_paint('remote', pil_img)
             self.remote_video_enabled = True
             
+    def _set_remote_audio_enabled(self, enabled):
+        """
+        Set whether received audio is played.
+        
+        The connection is told as well, so it drops audio frames as soon
+        as they are read while remote audio is off or muted.
+        
+        Args:
+            enabled: True to play received audio, False otherwise
+        """
+        self.remote_audio_enabled = enabled
+        self.connection.set_remote_audio_sink_active(enabled)
+        
     def on_remote_audio_frame(self, audio_data, sample_rate, channels, 
                              frame_number):
         """Callback for remote audio frames"""
@@ -824,17 +1100,17 @@ class MainWindow:
         """Callback for control messages"""
         if control_type == ControlType.VIDEO_ON:
             self.remote_video_enabled = True
-            logging.info("Remote video turned on")
+            logger.info("Remote video turned on")
         elif control_type == ControlType.VIDEO_OFF:
             self.remote_video_enabled = False
             self.remote_video.configure(image=None, text="Remote Camera Off")
-            logging.info("Remote video turned off")
+            logger.info("Remote video turned off")
         elif control_type == ControlType.AUDIO_ON:
-            self.remote_audio_enabled = True
-            logging.info("Remote audio turned on")
+            self._set_remote_audio_enabled(True)
+            logger.info("Remote audio turned on")
         elif control_type == ControlType.AUDIO_OFF:
-            self.remote_audio_enabled = False
-            logging.info("Remote audio turned off")
+            self._set_remote_audio_enabled(False)
+            logger.info("Remote audio turned off")
             
     def on_status_message(self, status_type, message, code):
         """Callback for status messages"""
@@ -848,6 +1124,7 @@ class MainWindow:
     def on_connected(self):
         """Callback when a connection is established"""
         self.is_connected = True
+        self._ui_is_disconnected = False
         self.update_status("Connected", "green")
         
         # Update connection info
@@ -870,7 +1147,7 @@ class MainWindow:
         # Reset mute states
         self.local_mute_var.set("off")
         self.remote_mute_var.set("off")
-        self.remote_audio_enabled = True
+        self._set_remote_audio_enabled(True)
         
         # Reset volume
         self.volume_var.set(1.0)
@@ -879,8 +1156,16 @@ class MainWindow:
         
     def on_disconnected(self):
         """Callback when a connection is closed"""
+        self._reset_ui_to_disconnected()
+        
+    def _reset_ui_to_disconnected(self):
+        """Put the window back into the disconnected state, once per session"""
         self.is_connected = False
         self.is_hosting = False
+        if self._ui_is_disconnected:
+            return
+        self._ui_is_disconnected = True
+        
         self.update_status("Disconnected", "gray")
         self.connection_info.configure(text="Not connected")
         
@@ -892,48 +1177,77 @@ class MainWindow:
         # Clear remote video
         self.remote_video.configure(image=None, text="Not Connected")
         self.remote_video_enabled = False
-        self.remote_audio_enabled = False
-        
-    def update_statistics(self):
-        """Update the statistics display"""
+        self._set_remote_audio_enabled(False)
+        
+    def _stats_loop(self):
+        """Format the statistics every interval and hand them to the UI thread"""
+        while not self._closing.wait(self.stats_update_interval):
+            stats = self.format_statistics()
+            if stats is None:
+                continue
+                
+            try:
+                self.root.after_idle(self._apply_statistics, stats)
+            except RuntimeError:
+                # The main loop has already exited
+                break
+                
+    def format_statistics(self):
+        """
+        Format the statistics display values.
+        
+        Returns:
+            dict or None: Display text per statistics field, or None if
+            nothing changed since the last call
+        """
         if not self.is_connected:
-            stats = "Not connected"
+            stats = dict.fromkeys(self._stat_vars, "-")
+            stats['connected'] = "Not connected"
         else:
             net_stats = self.connection.get_statistics()
+            stats = {
+                'connected': str(net_stats['connected']),
+                'remote_address': str(net_stats['remote_address']),
+                'local_address': str(net_stats['local_address']),
+                'bytes_sent': f"{net_stats['bytes_sent'] / 1024:.1f} KB",
+                'bytes_received': f"{net_stats['bytes_received'] / 1024:.1f} KB",
+                'messages_sent': str(net_stats['messages_sent']),
+                'messages_received': str(net_stats['messages_received']),
+                'local_video': 'On' if self.video_enabled else 'Off',
+                'remote_video': 'On' if self.remote_video_enabled else 'Off',
+                'local_audio': 'On' if self.audio_enabled else 'Off',
+                'remote_audio': 'On' if self.remote_audio_enabled else 'Off'
+            }
             
-            # Format statistics
-            stats = (
-                f"Connection:\n"
-                f"  Connected: {net_stats['connected']}\n"
-                f"  Remote: {net_stats['remote_address']}\n"
-                f"  Local: {net_stats['local_address']}\n\n"
-                f"Data:\n"
-                f"  Sent: {net_stats['bytes_sent'] / 1024:.1f} KB\n"
-                f"  Received: {net_stats['bytes_received'] / 1024:.1f} KB\n"
-                f"  Messages sent: {net_stats['messages_sent']}\n"
-                f"  Messages received: {net_stats['messages_received']}\n\n"
-                f"Video:\n"
-                f"  Local: {'On' if self.video_enabled else 'Off'}\n"
-                f"  Remote: {'On' if self.remote_video_enabled else 'Off'}\n\n"
-                f"Audio:\n"
-                f"  Local: {'On' if self.audio_enabled else 'Off'}\n"
-                f"  Remote: {'On' if self.remote_audio_enabled else 'Off'}"
-            )
+        if stats == self._last_stats:
+            return None
+        
+        # Only pass on the fields that changed
+        last = self._last_stats or {}
+        self._last_stats = stats
+        return {
+            field: value for field, value in stats.items()
+            if last.get(field) != value
+        }
+        
+    def _apply_statistics(self, stats):
+        """Update the statistics display (UI thread only)"""
+        if self._closing.is_set():
+            return
             
-        # Update the statistics text
-        self.stats_text.configure(state="normal")
-        self.stats_text.delete("1.0", "end")
-        self.stats_text.insert("1.0", stats)
-        self.stats_text.configure(state="disabled")
-        
-        # Schedule the next update
-        self.root.after(
-            int(self.stats_update_interval * 1000), 
-            self.update_statistics
-        )
+        # Update the changed values
+        for field, value in stats.items():
+            self._stat_vars[field].set(value)
         
     def on_close(self):
         """Handle window close event"""
+        if self._closed:
+            return
+        self._closed = True
+        
+        # Stop the statistics thread
+        self._closing.set()
+        
         # Disconnect if connected
         if self.is_connected:
             self.connection.disconnect()
@@ -943,26 +1257,43 @@ class MainWindow:
         self.audio_capture.stop()
         self.audio_playback.stop()
         
-        # Close the window
-        self.root.destroy()
+        # Stop the encoder thread
+        self._encode_event.set()
+        
+        # Close the window; it may already be gone when called at exit
+        try:
+            self.root.destroy()
+        except Exception as e:
+            logger.debug("Window already destroyed: %s", e)
         
     def run(self):
         """Run the application"""
         self.root.mainloop()
         
-    def __del__(self):
-        """Clean up resources"""
-        if hasattr(self, 'local_video_capture'):
-            self.local_video_capture.stop()
-            
-        if hasattr(self, 'audio_capture'):
-            self.audio_capture.stop()
-            
-        if hasattr(self, 'audio_playback'):
-            self.audio_playback.stop()
+    def _queue_state(self, kind, enabled):
+        """
+        Queue a video or audio state change for the remote peer.
+        
+        Changes made within a short window are coalesced, so a burst of
+        toggles only sends the final state of each kind.
+        
+        Args:
+            kind: 'video' or 'audio'
+            enabled: True if enabled, False otherwise
+        """
+        self._pending_state[kind] = enabled
+        if self._state_after_id is None:
+            self._state_after_id = self.root.after(10, self._flush_state)
             
-        if hasattr(self, 'connection') and self.is_connected:
-            self.connection.disconnect() 
+    def _flush_state(self):
+        """Send the queued video and audio states to the remote peer"""
+        self._state_after_id = None
+        pending, self._pending_state = self._pending_state, {}
+        
+        if 'video' in pending:
+            self.connection.set_video_state(pending['video'])
+        if 'audio' in pending:
+            self.connection.set_audio_state(pending['audio'])
             
     def toggle_local_mute(self):
         """Toggle the local microphone mute state"""
@@ -971,24 +1302,24 @@ class MainWindow:
             self.update_status("Local microphone muted", "orange")
             # We don't stop the audio capture, just prevent sending
             if self.is_connected:
-                self.connection.set_audio_state(False)
+                self._queue_state('audio', False)
         else:
             # Unmute local audio
             self.update_status("Local microphone unmuted", "green")
             if self.audio_enabled and self.is_connected:
-                self.connection.set_audio_state(True)
+                self._queue_state('audio', True)
     
     def toggle_remote_mute(self):
         """Toggle the remote audio (speaker) mute state"""
         if self.remote_mute_var.get() == "on":
             # Mute remote audio (don't play received audio)
-            self.remote_audio_enabled = False
+            self._set_remote_audio_enabled(False)
             self.update_status("Remote audio muted", "orange")
             # Disable volume slider
             self.volume_slider.configure(state="disabled")
         else:
             # Unmute remote audio
-            self.remote_audio_enabled = True
+            self._set_remote_audio_enabled(True)
             self.update_status("Remote audio unmuted", "green")
             # Enable volume slider
             self.volume_slider.configure(state="normal")
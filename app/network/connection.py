@@ -7,8 +7,9 @@ import threading
 import json
 import logging
 import time
-import queue
-import pickle
+import collections
+import struct
+import zlib
 from typing import Callable, Dict, Any, Optional, List, Tuple
 
 from app.network.protocol_pb2 import (
@@ -16,6 +17,238 @@ from app.network.protocol_pb2 import (
     ControlType, StatusType
 )
 
+try:
+    import lz4.block
+except ImportError:
+    # Optional: without lz4 frames can only be compressed with zlib
+    lz4 = None
+
+
+# Big-endian length prefix in front of every message
+_LENGTH_PREFIX = struct.Struct('>I')
+
+# Largest message accepted from the peer; the receive buffer is allocated
+# from the length prefix, so a corrupt prefix mustn't commit gigabytes
+_MAX_MESSAGE_SIZE = 16 * 1024 * 1024
+
+# Vectored sends need sendmsg, which Windows sockets don't have
+_HAS_SENDMSG = hasattr(socket.socket, 'sendmsg')
+
+# Flag telling the kernel more data follows immediately (Linux only)
+_MSG_MORE = getattr(socket, 'MSG_MORE', 0)
+
+# Most messages and bytes _send_loop gathers from the queue into one send
+_BATCH_MAX_MESSAGES = 16
+_BATCH_MAX_BYTES = 64 * 1024
+
+# Most buffers passed to one sendmsg call, well below the usual IOV_MAX
+_BATCH_MAX_VIEWS = 256
+
+
+def _encode_control(control_type):
+    """
+    Encode a control message without data, including its length prefix.
+    
+    The timestamp is left out, so the receiver stamps the message with the
+    time it arrived.
+    
+    Args:
+        control_type: Control type
+        
+    Returns:
+        bytes: The length-prefixed message
+    """
+    message = VideoMessage(payload=ControlMessage(type=control_type))
+    message.timestamp = 0
+    data = message.SerializeToString()
+    return _LENGTH_PREFIX.pack(len(data)) + data
+
+
+# Control messages without data never change, so they are encoded once here
+# and queued as bytes instead of being built for every heartbeat
+_CACHED_CONTROL = {
+    control_type: _encode_control(control_type) for control_type in ControlType
+}
+
+# The decoded control message for each cached encoding without its length
+# prefix, shared by every receive since handlers only read it
+_DECODED_CONTROL = {
+    data[4:]: ControlMessage(type=control_type)
+    for control_type, data in _CACHED_CONTROL.items()
+}
+_CACHED_CONTROL_MAX_SIZE = max(map(len, _DECODED_CONTROL))
+
+# Kernel send/receive buffer size for connected sockets, so bursts of video
+# frames don't overrun the socket queues
+_SOCKET_BUFFER_SIZE = 2 * 1024 * 1024
+
+# Local IP address and the time.monotonic() it was looked up at, refreshed
+# once it is older than _LOCAL_IP_MAX_AGE seconds
+_local_ip_cache = [None, 0.0]
+_LOCAL_IP_MAX_AGE = 60.0
+
+# Video encodings that are already entropy coded, so compressing the frame
+# data again would only cost CPU
+_COMPRESSED_ENCODINGS = frozenset(('jpeg', 'h264'))
+
+# What is logged when the remote peer turns its video or audio on or off
+_REMOTE_STATE_MESSAGES = {
+    ControlType.VIDEO_ON: "Remote video turned on",
+    ControlType.VIDEO_OFF: "Remote video turned off",
+    ControlType.AUDIO_ON: "Remote audio turned on",
+    ControlType.AUDIO_OFF: "Remote audio turned off",
+}
+
+
+def _local_ip():
+    """
+    Get the IPv4 address of the interface used to reach other machines.
+    
+    Unlike resolving the host name, this needs no DNS lookup, which can
+    block for a long time on a misconfigured machine. The result is cached
+    for _LOCAL_IP_MAX_AGE seconds.
+    
+    Returns:
+        str: The local IP address, or '127.0.0.1' if there is no network
+    """
+    address, looked_up = _local_ip_cache
+    now = time.monotonic()
+    if address is not None and now - looked_up < _LOCAL_IP_MAX_AGE:
+        return address
+        
+    try:
+        # Connecting a UDP socket sends nothing; it only picks the
+        # interface packets to that address would leave from
+        with socket.socket(socket.AF_INET, socket.SOCK_DGRAM) as probe:
+            probe.connect(('8.8.8.8', 80))
+            address = probe.getsockname()[0]
+    except OSError:
+        address = '127.0.0.1'
+        
+    _local_ip_cache[:] = (address, now)
+    return address
+
+
+def _compress(data, codec):
+    """
+    Compress frame or audio data.
+    
+    Args:
+        data: Bytes-like data to compress
+        codec: 'lz4' or 'zlib'
+        
+    Returns:
+        bytes or None: The compressed data, or None if it wasn't smaller
+    """
+    if codec == 'lz4':
+        compressed = lz4.block.compress(data, mode='fast', acceleration=4)
+    else:
+        compressed = zlib.compress(data, 1)
+    return compressed if len(compressed) < memoryview(data).nbytes else None
+
+
+def _decompress(data, codec):
+    """
+    Decompress received frame or audio data.
+    
+    Args:
+        data: Bytes-like compressed data
+        codec: Codec named in the message's compression field
+        
+    Returns:
+        bytes: The decompressed data
+    """
+    if codec == 'lz4':
+        if lz4 is None:
+            raise ValueError("lz4 compressed data received but lz4 is not installed")
+        return lz4.block.decompress(data)
+    if codec == 'zlib':
+        return zlib.decompress(data)
+    raise ValueError(f"Unknown compression: {codec}")
+
+
+class _SocketReader:
+    """
+    Reads from a socket through a buffer, so several small messages that
+    arrive together are fetched with a single recv call.
+    """
+    
+    def __init__(self, sock, buffer_size=64 * 1024):
+        """
+        Initialize the reader.
+        
+        Args:
+            sock: Socket to read from
+            buffer_size: Size of the receive buffer in bytes (default: 64 KB)
+        """
+        self.sock = sock
+        self.buffer = memoryview(bytearray(buffer_size))
+        self.start = 0
+        self.end = 0
+        
+    def read_into(self, view):
+        """
+        Fill a buffer with data from the socket.
+        
+        Args:
+            view: memoryview of the buffer to fill
+            
+        Returns:
+            int: Number of bytes read, less than the buffer size if the
+                 connection was closed first
+        """
+        size = len(view)
+        
+        # Take whatever is already buffered first
+        received = min(self.end - self.start, size)
+        view[:received] = self.buffer[self.start:self.start + received]
+        self.start += received
+        
+        # The buffer is empty if more is needed
+        while received < size:
+            remaining = size - received
+            if remaining >= len(self.buffer):
+                # Large reads go straight into the destination
+                count = self.sock.recv_into(view[received:], remaining)
+                if not count:
+                    break
+                received += count
+            else:
+                # Refill the buffer with as much as the socket has ready
+                count = self.sock.recv_into(self.buffer)
+                if not count:
+                    break
+                taken = min(count, remaining)
+                view[received:received + taken] = self.buffer[:taken]
+                self.start = taken
+                self.end = count
+                received += taken
+                
+        return received
+        
+    def unpack(self, fmt):
+        """
+        Read a fixed-size value from the socket and unpack it.
+        
+        Args:
+            fmt: struct.Struct describing the value
+            
+        Returns:
+            tuple: The unpacked fields, or None if the connection was closed
+                   first
+        """
+        size = fmt.size
+        if self.end - self.start >= size:
+            # Unpack straight out of the buffer without copying
+            fields = fmt.unpack_from(self.buffer, self.start)
+            self.start += size
+            return fields
+            
+        data = bytearray(size)
+        if self.read_into(memoryview(data)) < size:
+            return None
+        return fmt.unpack(data)
+
 
 class Connection:
     """
@@ -24,7 +257,7 @@ class Connection:
     
     def __init__(self, on_video_frame=None, on_audio_frame=None,
                  on_control=None, on_status=None, on_connect=None,
-                 on_disconnect=None):
+                 on_disconnect=None, compression=None):
         """
         Initialize the connection handler.
         
@@ -35,6 +268,10 @@ class Connection:
             on_status: Callback for status messages
             on_connect: Callback when a connection is established
             on_disconnect: Callback when a connection is closed
+            compression: Codec used to compress audio and video frame data
+                         that isn't entropy coded already, 'lz4' or 'zlib'
+                         (default: None to send it as is). Received data is
+                         decompressed whatever this is set to.
         """
         self.socket = None
         self.client_socket = None
@@ -55,8 +292,17 @@ class Connection:
         # Default port
         self.default_port = 8000
         
-        # Message queue for sending
-        self.send_queue = queue.Queue(maxsize=100)
+        # Fall back to zlib, which is always available, without lz4
+        if compression == 'lz4' and lz4 is None:
+            logging.warning("lz4 is not installed, compressing with zlib")
+            compression = 'zlib'
+        self.compression = compression
+        
+        # Message queue for sending; the send thread is its only consumer,
+        # so a deque's atomic append/popleft plus an event to wake the
+        # thread is all the locking it needs
+        self.send_queue = collections.deque(maxlen=100)
+        self._send_event = threading.Event()
         
         # Connection info
         self.remote_address = None
@@ -70,6 +316,22 @@ class Connection:
         self.last_ping_time = 0
         self.ping_interval = 5.0  # seconds
         
+        # Whether received audio frames are wanted; when False they are
+        # dropped before reaching on_audio_frame
+        self.remote_audio_active = True
+        
+        # Handlers for received control messages by type
+        self._control_handlers = {
+            ControlType.CONNECT: self._on_connect_request,
+            ControlType.DISCONNECT: self._on_disconnect_request,
+            ControlType.PING: self._on_ping,
+            ControlType.PONG: self._on_pong,
+            ControlType.VIDEO_ON: self._on_remote_state,
+            ControlType.VIDEO_OFF: self._on_remote_state,
+            ControlType.AUDIO_ON: self._on_remote_state,
+            ControlType.AUDIO_OFF: self._on_remote_state,
+        }
+        
         # Heartbeat
         self.last_heartbeat = 0
         self.heartbeat_interval = 1.0  # seconds
@@ -94,6 +356,9 @@ class Connection:
         try:
             self.socket = socket.socket(socket.AF_INET, socket.SOCK_STREAM)
             self.socket.setsockopt(socket.SOL_SOCKET, socket.SO_REUSEADDR, 1)
+            # Buffer sizes must be set before listening to be used for the
+            # TCP window; accepted sockets inherit them
+            self._configure_socket(self.socket)
             self.socket.bind(('0.0.0.0', port))
             self.socket.listen(1)
             
@@ -106,7 +371,7 @@ class Connection:
             self.recv_thread.start()
             
             # Get local address
-            self.local_address = (socket.gethostbyname(socket.gethostname()), port)
+            self.local_address = (_local_ip(), port)
             
             logging.info(f"Hosting on {self.local_address[0]}:{self.local_address[1]}")
             
@@ -137,6 +402,7 @@ class Connection:
             
         try:
             self.socket = socket.socket(socket.AF_INET, socket.SOCK_STREAM)
+            self._configure_socket(self.socket)
             self.socket.connect((host, port))
             
             self.is_server = False
@@ -196,6 +462,9 @@ class Connection:
         self.is_running = False
         self.is_connected = False
         
+        # Wake the send thread, which may be sleeping until the next heartbeat
+        self._send_event.set()
+        
         # Wait for threads to finish
         current_thread = threading.current_thread()
         
@@ -223,11 +492,7 @@ class Connection:
             self.socket = None
             
         # Clear the queue
-        while not self.send_queue.empty():
-            try:
-                self.send_queue.get_nowait()
-            except queue.Empty:
-                break
+        self.send_queue.clear()
                 
         # Call the disconnect callback
         if self.on_disconnect:
@@ -237,6 +502,25 @@ class Connection:
             
         return True
         
+    def _configure_socket(self, sock):
+        """
+        Set the options used for every connected socket.
+        
+        Args:
+            sock: TCP socket to configure
+        """
+        # Disable Nagle's algorithm; each message is written in one send,
+        # so waiting to coalesce segments would only add latency
+        sock.setsockopt(socket.IPPROTO_TCP, socket.TCP_NODELAY, 1)
+        
+        sock.setsockopt(socket.SOL_SOCKET, socket.SO_SNDBUF, _SOCKET_BUFFER_SIZE)
+        sock.setsockopt(socket.SOL_SOCKET, socket.SO_RCVBUF, _SOCKET_BUFFER_SIZE)
+        
+        # Acknowledge right away instead of delaying ACKs (Linux only), which
+        # keeps PING/PONG round trips short
+        if hasattr(socket, 'TCP_QUICKACK'):
+            sock.setsockopt(socket.IPPROTO_TCP, socket.TCP_QUICKACK, 1)
+        
     def send_video_frame(self, frame_data, width, height, encoding, frame_number):
         """
         Send a video frame to the remote peer.
@@ -254,13 +538,22 @@ class Connection:
         if not self.is_connected:
             return False
             
+        # Compress frame data that isn't compressed already
+        compression = ""
+        if self.compression and encoding not in _COMPRESSED_ENCODINGS:
+            compressed = _compress(frame_data, self.compression)
+            if compressed is not None:
+                frame_data = compressed
+                compression = self.compression
+                
         # Create a video frame message
         video_frame = VideoFrame(
             frame_data=frame_data,
             width=width,
             height=height,
             encoding=encoding,
-            frame_number=frame_number
+            frame_number=frame_number,
+            compression=compression
         )
         
         # Create a video message
@@ -285,18 +578,30 @@ class Connection:
         if not self.is_connected:
             return False
             
-        # Convert numpy array to bytes if needed
-        if hasattr(audio_data, 'tobytes'):
-            audio_bytes = audio_data.tobytes()
-        else:
-            audio_bytes = audio_data
-            
+        # Compress the samples, which also copies them out of the capture
+        # buffer
+        compression = ""
+        audio_bytes = None
+        if self.compression:
+            audio_bytes = _compress(audio_data, self.compression)
+            if audio_bytes is not None:
+                compression = self.compression
+                
+        # Otherwise copy numpy arrays and memoryviews to bytes, since the
+        # capture buffer is reused once the callback returns
+        if audio_bytes is None:
+            if hasattr(audio_data, 'tobytes'):
+                audio_bytes = audio_data.tobytes()
+            else:
+                audio_bytes = audio_data
+                
         # Create an audio frame message
         audio_frame = AudioFrame(
             audio_data=audio_bytes,
             sample_rate=sample_rate,
             channels=channels,
-            frame_number=frame_number
+            frame_number=frame_number,
+            compression=compression
         )
         
         # Create a video message
@@ -347,6 +652,10 @@ class Connection:
         if not self.is_connected and control_type != ControlType.DISCONNECT:
             return False
             
+        # Queue the pre-encoded message when there is no data
+        if not data:
+            return self._queue_message(_CACHED_CONTROL[control_type])
+            
         # Create a control message
         control = ControlMessage(
             type=control_type,
@@ -359,23 +668,37 @@ class Connection:
         # Queue the message for sending
         return self._queue_message(message)
         
+    def _send_heartbeat(self):
+        """
+        Queue a heartbeat PING for the remote peer.
+        
+        The PING is the same pre-encoded bytes every time, so no message
+        objects are built for it.
+        
+        Returns:
+            bool: True if queued successfully, False otherwise
+        """
+        return self._queue_message(_CACHED_CONTROL[ControlType.PING])
+        
     def _queue_message(self, message):
         """
         Queue a message for sending.
         
         Args:
-            message: Message to queue
+            message: Message to queue, or an already encoded message with
+                     its length prefix
             
         Returns:
             bool: True if queued successfully, False otherwise
         """
-        try:
-            self.send_queue.put_nowait(message)
-            return True
-        except queue.Full:
+        if len(self.send_queue) >= self.send_queue.maxlen:
             logging.warning("Send queue is full, dropping message")
             return False
             
+        self.send_queue.append(message)
+        self._send_event.set()
+        return True
+            
     def _server_loop(self):
         """Internal method for the server connection loop."""
         try:
@@ -383,6 +706,7 @@ class Connection:
             
             # Wait for a client to connect
             self.client_socket, addr = self.socket.accept()
+            self._configure_socket(self.client_socket)
             self.is_connected = True
             self.remote_address = addr
             
@@ -418,41 +742,36 @@ class Connection:
             
     def _send_loop(self):
         """Internal method for sending messages."""
-        last_heartbeat = time.time()
+        next_heartbeat = time.monotonic() + self.heartbeat_interval
         
         while self.is_running and self.is_connected:
             try:
-                # Check if we need to send a heartbeat
-                current_time = time.time()
-                if current_time - last_heartbeat >= self.heartbeat_interval:
-                    self._send_control(ControlType.PING)
-                    last_heartbeat = current_time
+                # Send a heartbeat when it is due
+                current_time = time.monotonic()
+                if current_time >= next_heartbeat:
+                    self._send_heartbeat()
+                    next_heartbeat = current_time + self.heartbeat_interval
                     
-                # Get a message from the queue
-                try:
-                    message = self.send_queue.get(timeout=0.1)
-                except queue.Empty:
+                # Sleep until a message is queued or the next heartbeat is
+                # due; the queue is checked again after clearing, so a
+                # wakeup can't be lost
+                if not self.send_queue:
+                    self._send_event.wait(next_heartbeat - current_time)
+                    self._send_event.clear()
                     continue
                     
-                # Convert the message to a dictionary
-                message_dict = message.to_dict()
+                # Take whatever is already queued, so a run of small audio
+                # and control messages goes out in a single send
+                batch = []
+                count, batch_bytes = self._take_queued(batch)
                 
-                # Serialize the message
-                data = pickle.dumps(message_dict)
+                # Send the length prefixes and data
+                sock = self.client_socket if self.is_server else self.socket
+                more_count, more_bytes = self._send_parts(sock, batch)
                 
-                # Add length prefix for message framing
-                length = len(data)
-                length_bytes = length.to_bytes(4, byteorder='big')
-                
-                # Send the length prefix and data
-                if self.is_server:
-                    self.client_socket.sendall(length_bytes + data)
-                else:
-                    self.socket.sendall(length_bytes + data)
-                    
                 # Update statistics
-                self.bytes_sent += length + 4
-                self.messages_sent += 1
+                self.bytes_sent += batch_bytes + more_bytes
+                self.messages_sent += count + more_count
                 
             except Exception as e:
                 if self.is_running and self.is_connected:
@@ -460,6 +779,95 @@ class Connection:
                     self.disconnect()
                 break
                 
+    def _take_queued(self, parts):
+        """
+        Move queued messages into a list of buffers to send.
+        
+        Messages are taken until the queue is empty or the batch limits are
+        reached.
+        
+        Args:
+            parts: List the length prefix and parts of each message are
+                   appended to
+                   
+        Returns:
+            tuple: (number of messages taken, number of bytes appended)
+        """
+        count = 0
+        size = 0
+        while count < _BATCH_MAX_MESSAGES and size < _BATCH_MAX_BYTES:
+            try:
+                message = self.send_queue.popleft()
+            except IndexError:
+                break
+                
+            if isinstance(message, bytes):
+                # Already encoded, length prefix included
+                parts.append(message)
+                size += len(message)
+            else:
+                # Serialize the message into parts, leaving the frame data
+                # as its own buffer
+                message_parts = message.SerializeToParts()
+                
+                # Add length prefix for message framing
+                length = sum(map(len, message_parts))
+                parts.append(_LENGTH_PREFIX.pack(length))
+                parts.extend(message_parts)
+                size += length + 4
+            count += 1
+            
+        return count, size
+        
+    def _send_parts(self, sock, parts):
+        """
+        Send a list of buffers in order, as one stream of bytes.
+        
+        The buffers are handed to the kernel together with sendmsg, so the
+        frame data is never copied into a joined buffer first. When the
+        socket is full, messages queued in the meantime are added to the
+        same send rather than waiting for the next one.
+        
+        Args:
+            sock: Socket to send on
+            parts: List of bytes-like objects
+            
+        Returns:
+            tuple: (number of messages added, number of bytes added)
+        """
+        if not _HAS_SENDMSG:
+            sock.sendall(b''.join(parts))
+            return 0, 0
+            
+        count = 0
+        size = 0
+        views = [memoryview(part).cast('B') for part in parts if len(part)]
+        while views:
+            # While more messages are queued, let the kernel hold back a
+            # partly filled last segment for the send that follows
+            flags = _MSG_MORE if self.send_queue else 0
+            sent = sock.sendmsg(views, (), flags)
+            
+            # Drop the buffers that were sent completely and trim the one
+            # that was cut off by a short write
+            while views and sent >= len(views[0]):
+                sent -= len(views[0])
+                del views[0]
+            if sent:
+                views[0] = views[0][sent:]
+                
+            # A short write means the socket buffer is full; append what
+            # was queued meanwhile, so it goes out once the socket drains
+            if views and len(views) < _BATCH_MAX_VIEWS and self.send_queue:
+                more = []
+                more_count, more_size = self._take_queued(more)
+                views.extend(memoryview(part).cast('B') for part in more
+                             if len(part))
+                count += more_count
+                size += more_size
+                
+        return count, size
+        
     def _process_incoming_data(self, sock):
         """
         Process incoming data from the socket.
@@ -469,6 +877,13 @@ class Connection:
         """
         last_heartbeat = time.time()
         
+        # Read through a buffer, so small messages don't each need a recv
+        reader = _SocketReader(sock)
+        
+        # Set a timeout for the socket once, so the heartbeat check below
+        # still runs while nothing is arriving
+        sock.settimeout(1.0)
+        
         while self.is_running and self.is_connected:
             try:
                 # Check for heartbeat timeout
@@ -478,31 +893,25 @@ class Connection:
                     self.disconnect()
                     break
                     
-                # Set a timeout for the socket
-                sock.settimeout(1.0)
-                
                 # Read the length prefix (4 bytes)
-                length_bytes = sock.recv(4)
-                if not length_bytes or len(length_bytes) < 4:
+                prefix = reader.unpack(_LENGTH_PREFIX)
+                if prefix is None:
                     if self.is_connected:
                         logging.debug("Connection closed by remote host")
                         self.disconnect()
                     break
-                    
-                # Convert length bytes to integer
-                length = int.from_bytes(length_bytes, byteorder='big')
+                length = prefix[0]
+                if length > _MAX_MESSAGE_SIZE:
+                    logging.error(f"Message of {length} bytes exceeds the "
+                                  f"{_MAX_MESSAGE_SIZE} byte limit, "
+                                  f"disconnecting")
+                    self.disconnect()
+                    break
                 
-                # Read the data
-                data_bytes = b''
-                remaining = length
-                while remaining > 0:
-                    chunk = sock.recv(min(remaining, 4096))
-                    if not chunk:
-                        break
-                    data_bytes += chunk
-                    remaining -= len(chunk)
-                    
-                if len(data_bytes) < length:
+                # Read the data straight into a buffer of the final size; a
+                # new one per message, since decoded frames are views into it
+                data_bytes = bytearray(length)
+                if reader.read_into(memoryview(data_bytes)) < length:
                     if self.is_connected:
                         logging.warning("Incomplete message received")
                         self.disconnect()
@@ -512,41 +921,60 @@ class Connection:
                 self.bytes_received += length + 4
                 self.messages_received += 1
                 
+                # Control messages without data arrive in their cached
+                # encoding, so they are looked up instead of parsed
+                if length <= _CACHED_CONTROL_MAX_SIZE:
+                    control = _DECODED_CONTROL.get(bytes(data_bytes))
+                    if control is not None:
+                        last_heartbeat = time.time()
+                        self._handle_control_message(control)
+                        continue
+                        
                 # Deserialize the message
-                message_dict = pickle.loads(data_bytes)
-                
-                # Convert the dictionary to a VideoMessage
-                message = VideoMessage.from_dict(message_dict)
+                message = VideoMessage.FromString(data_bytes)
                 
                 # Update last heartbeat time
                 last_heartbeat = time.time()
                 
                 # Process the message based on its type
                 payload = message.payload
+                kind = message.WhichOneof('payload')
                 
-                if isinstance(payload, VideoFrame):
+                if kind == 'video_frame':
                     # Video frame
                     if self.on_video_frame:
+                        frame_data = payload.frame_data
+                        if payload.compression:
+                            frame_data = self._decompress_payload(
+                                frame_data, payload.compression)
+                            if frame_data is None:
+                                continue
                         self.on_video_frame(
-                            payload.frame_data,
+                            frame_data,
                             payload.width,
                             payload.height,
                             payload.encoding,
                             payload.frame_number
                         )
-                elif isinstance(payload, AudioFrame):
+                elif kind == 'audio_frame':
                     # Audio frame
-                    if self.on_audio_frame:
+                    if self.on_audio_frame and self.remote_audio_active:
+                        audio_data = payload.audio_data
+                        if payload.compression:
+                            audio_data = self._decompress_payload(
+                                audio_data, payload.compression)
+                            if audio_data is None:
+                                continue
                         self.on_audio_frame(
-                            payload.audio_data,
+                            audio_data,
                             payload.sample_rate,
                             payload.channels,
                             payload.frame_number
                         )
-                elif isinstance(payload, ControlMessage):
+                elif kind == 'control':
                     # Control message
                     self._handle_control_message(payload)
-                elif isinstance(payload, StatusMessage):
+                elif kind == 'status':
                     # Status message
                     if self.on_status:
                         self.on_status(
@@ -566,6 +994,24 @@ class Connection:
                     self.disconnect()
                 break
                 
+    def _decompress_payload(self, data, codec):
+        """
+        Decompress received frame or audio data.
+        
+        Args:
+            data: Compressed data
+            codec: Codec named in the message's compression field
+            
+        Returns:
+            bytes or None: The decompressed data, or None if it couldn't be
+                           decompressed and the frame should be dropped
+        """
+        try:
+            return _decompress(data, codec)
+        except Exception as e:
+            logging.warning(f"Dropping frame that failed to decompress: {e}")
+            return None
+            
     def _handle_control_message(self, control):
         """
         Handle a control message.
@@ -573,48 +1019,39 @@ class Connection:
         Args:
             control: Control message
         """
-        if control.type == ControlType.CONNECT:
-            # Connection request
-            logging.info("Received connection request")
-            # Only respond if we're not already connected
-            if not self.is_connected:
-                # Send a connect response
-                self._send_control(ControlType.CONNECT)
-        elif control.type == ControlType.DISCONNECT:
-            # Disconnect request
-            logging.info("Received disconnect request")
-            self.disconnect()
-        elif control.type == ControlType.PING:
-            # Ping request
-            # Send a pong response
-            self._send_control(ControlType.PONG)
-        elif control.type == ControlType.PONG:
-            # Pong response
-            # Update ping time
-            self.last_ping_time = time.time()
-        elif control.type == ControlType.VIDEO_ON:
-            # Video on
-            logging.info("Remote video turned on")
-            if self.on_control:
-                self.on_control(control.type, control.data)
-        elif control.type == ControlType.VIDEO_OFF:
-            # Video off
-            logging.info("Remote video turned off")
-            if self.on_control:
-                self.on_control(control.type, control.data)
-        elif control.type == ControlType.AUDIO_ON:
-            # Audio on
-            logging.info("Remote audio turned on")
-            if self.on_control:
-                self.on_control(control.type, control.data)
-        elif control.type == ControlType.AUDIO_OFF:
-            # Audio off
-            logging.info("Remote audio turned off")
-            if self.on_control:
-                self.on_control(control.type, control.data)
+        handler = self._control_handlers.get(control.type)
+        if handler:
+            handler(control)
         else:
             logging.warning(f"Unknown control type: {control.type}")
             
+    def _on_connect_request(self, control):
+        """Handle a CONNECT control message."""
+        logging.info("Received connection request")
+        # Only respond if we're not already connected
+        if not self.is_connected:
+            # Send a connect response
+            self._send_control(ControlType.CONNECT)
+            
+    def _on_disconnect_request(self, control):
+        """Handle a DISCONNECT control message."""
+        logging.info("Received disconnect request")
+        self.disconnect()
+        
+    def _on_ping(self, control):
+        """Handle a PING control message by sending a pong response."""
+        self._send_control(ControlType.PONG)
+        
+    def _on_pong(self, control):
+        """Handle a PONG control message by updating the ping time."""
+        self.last_ping_time = time.time()
+        
+    def _on_remote_state(self, control):
+        """Handle a VIDEO_ON/OFF or AUDIO_ON/OFF control message."""
+        logging.info(_REMOTE_STATE_MESSAGES[control.type])
+        if self.on_control:
+            self.on_control(control.type, control.data)
+            
     def get_statistics(self):
         """
         Get connection statistics.
@@ -650,6 +1087,15 @@ class Connection:
         """
         return not self.is_server and self.is_running
         
+    def set_remote_audio_sink_active(self, active):
+        """
+        Set whether received audio frames are passed to on_audio_frame.
+        
+        Args:
+            active: True to pass audio frames on, False to drop them
+        """
+        self.remote_audio_active = active
+        
     def set_video_state(self, enabled):
         """
         Set the video state and notify the remote peer.
@@ -1,16 +1,120 @@
 """
 Generated protocol buffer code for video chat application.
 This would normally be generated using the protoc compiler, but we're creating it manually.
+
+The messages are encoded in the protobuf wire format described by
+protocol.proto, so the bytes are interchangeable with protoc-generated code.
+Decoded frame and audio data are memoryviews into the received buffer
+rather than copies of it.
 """
 
-import struct
 import time
-from enum import Enum
+from enum import IntEnum
 from dataclasses import dataclass
-from typing import Optional, Union, Dict, Any
+from typing import Iterator, List, Tuple, Union
+
+
+# Protobuf wire types
+_VARINT = 0
+_FIXED64 = 1
+_LENGTH_DELIMITED = 2
+_FIXED32 = 5
+
+
+def _encode_varint(value: int) -> bytes:
+    """Encode an integer as a varint, negative values as 64-bit two's complement."""
+    if value < 0:
+        value += 1 << 64
+    if value < 0x80:
+        return bytes((value,))
+    out = bytearray()
+    while value > 0x7F:
+        out.append((value & 0x7F) | 0x80)
+        value >>= 7
+    out.append(value)
+    return bytes(out)
+
+
+def _decode_varint(data: memoryview, pos: int) -> Tuple[int, int]:
+    """Decode the varint at pos, returning (value, position after it)."""
+    result = 0
+    shift = 0
+    while True:
+        byte = data[pos]
+        pos += 1
+        result |= (byte & 0x7F) << shift
+        if byte < 0x80:
+            return result, pos
+        shift += 7
+
+
+def _key(number: int, wire_type: int) -> bytes:
+    return _encode_varint((number << 3) | wire_type)
+
+
+def _varint_field(number: int, value: int) -> bytes:
+    # proto3 leaves fields holding the default value out of the message
+    if not value:
+        return b''
+    return _key(number, _VARINT) + _encode_varint(value)
 
 
-class ControlType(Enum):
+def _bytes_field(number: int, value: bytes) -> bytes:
+    if not value:
+        return b''
+    return _key(number, _LENGTH_DELIMITED) + _encode_varint(len(value)) + value
+
+
+def _bytes_field_parts(number: int, value) -> Tuple:
+    # The value is returned as its own part rather than copied into a new
+    # bytes object, so large frame data is never concatenated
+    if not len(value):
+        return ()
+    return _key(number, _LENGTH_DELIMITED) + _encode_varint(len(value)), value
+
+
+def _string_field(number: int, value: str) -> bytes:
+    return _bytes_field(number, value.encode('utf-8'))
+
+
+def _to_int32(value: int) -> int:
+    # Negative int32 values are sent as 64-bit two's complement
+    return value - (1 << 64) if value >= 1 << 63 else value
+
+
+def _parse_fields(data) -> Iterator[Tuple[int, Union[int, memoryview]]]:
+    """
+    Iterate over the fields of an encoded message.
+
+    Yields (field_number, value) pairs, where value is an int for varint
+    fields and a memoryview of the data for every other wire type.
+    """
+    view = memoryview(data)
+    end = len(view)
+    pos = 0
+    while pos < end:
+        key, pos = _decode_varint(view, pos)
+        number = key >> 3
+        wire_type = key & 0x07
+        if wire_type == _VARINT:
+            value, pos = _decode_varint(view, pos)
+        else:
+            if wire_type == _LENGTH_DELIMITED:
+                size, pos = _decode_varint(view, pos)
+            elif wire_type == _FIXED64:
+                size = 8
+            elif wire_type == _FIXED32:
+                size = 4
+            else:
+                raise ValueError(f"Unsupported wire type: {wire_type}")
+            if pos + size > end:
+                raise ValueError("Truncated message")
+            value = view[pos:pos + size]
+            pos += size
+        yield number, value
+
+
+class ControlType(IntEnum):
     CONNECT = 0
     DISCONNECT = 1
     PING = 2
@@ -21,7 +125,7 @@ class ControlType(Enum):
     AUDIO_OFF = 7
 
 
-class StatusType(Enum):
+class StatusType(IntEnum):
     INFO = 0
     WARNING = 1
     ERROR = 2
@@ -34,24 +138,31 @@ class VideoFrame:
     height: int
     encoding: str
     frame_number: int
+    compression: str = ""
+
+    def SerializeToString(self) -> bytes:
+        return b''.join(self.SerializeToParts())
 
-    def to_dict(self) -> Dict[str, Any]:
-        return {
-            "frame_data": self.frame_data,
-            "width": self.width,
-            "height": self.height,
-            "encoding": self.encoding,
-            "frame_number": self.frame_number
-        }
+    def SerializeToParts(self) -> List:
+        return [
+            *_bytes_field_parts(1, self.frame_data),
+            _varint_field(2, self.width),
+            _varint_field(3, self.height),
+            _string_field(4, self.encoding),
+            _varint_field(5, self.frame_number),
+            _string_field(6, self.compression)
+        ]
 
     @classmethod
-    def from_dict(cls, data: Dict[str, Any]) -> 'VideoFrame':
+    def FromString(cls, data: bytes) -> 'VideoFrame':
+        fields = dict(_parse_fields(data))
         return cls(
-            frame_data=data["frame_data"],
-            width=data["width"],
-            height=data["height"],
-            encoding=data["encoding"],
-            frame_number=data["frame_number"]
+            frame_data=fields.get(1, b''),
+            width=fields.get(2, 0),
+            height=fields.get(3, 0),
+            encoding=str(fields.get(4, b''), 'utf-8'),
+            frame_number=fields.get(5, 0),
+            compression=str(fields.get(6, b''), 'utf-8')
         )
 
 
@@ -61,22 +172,29 @@ class AudioFrame:
     sample_rate: int
     channels: int
     frame_number: int
+    compression: str = ""
 
-    def to_dict(self) -> Dict[str, Any]:
-        return {
-            "audio_data": self.audio_data,
-            "sample_rate": self.sample_rate,
-            "channels": self.channels,
-            "frame_number": self.frame_number
-        }
+    def SerializeToString(self) -> bytes:
+        return b''.join(self.SerializeToParts())
+
+    def SerializeToParts(self) -> List:
+        return [
+            *_bytes_field_parts(1, self.audio_data),
+            _varint_field(2, self.sample_rate),
+            _varint_field(3, self.channels),
+            _varint_field(4, self.frame_number),
+            _string_field(5, self.compression)
+        ]
 
     @classmethod
-    def from_dict(cls, data: Dict[str, Any]) -> 'AudioFrame':
+    def FromString(cls, data: bytes) -> 'AudioFrame':
+        fields = dict(_parse_fields(data))
         return cls(
-            audio_data=data["audio_data"],
-            sample_rate=data["sample_rate"],
-            channels=data["channels"],
-            frame_number=data["frame_number"]
+            audio_data=fields.get(1, b''),
+            sample_rate=fields.get(2, 0),
+            channels=fields.get(3, 0),
+            frame_number=fields.get(4, 0),
+            compression=str(fields.get(5, b''), 'utf-8')
         )
 
 
@@ -85,17 +203,21 @@ class ControlMessage:
     type: ControlType
     data: str = ""
 
-    def to_dict(self) -> Dict[str, Any]:
-        return {
-            "type": self.type.value,
-            "data": self.data
-        }
+    def SerializeToString(self) -> bytes:
+        return b''.join((
+            _varint_field(1, self.type),
+            _string_field(2, self.data)
+        ))
+
+    def SerializeToParts(self) -> List:
+        return [self.SerializeToString()]
 
     @classmethod
-    def from_dict(cls, data: Dict[str, Any]) -> 'ControlMessage':
+    def FromString(cls, data: bytes) -> 'ControlMessage':
+        fields = dict(_parse_fields(data))
         return cls(
-            type=ControlType(data["type"]),
-            data=data.get("data", "")
+            type=ControlType(fields.get(1, 0)),
+            data=str(fields.get(2, b''), 'utf-8')
         )
 
 
@@ -105,58 +227,89 @@ class StatusMessage:
     message: str
     code: int = 0
 
-    def to_dict(self) -> Dict[str, Any]:
-        return {
-            "type": self.type.value,
-            "message": self.message,
-            "code": self.code
-        }
+    def SerializeToString(self) -> bytes:
+        return b''.join((
+            _varint_field(1, self.type),
+            _string_field(2, self.message),
+            _varint_field(3, self.code)
+        ))
+
+    def SerializeToParts(self) -> List:
+        return [self.SerializeToString()]
 
     @classmethod
-    def from_dict(cls, data: Dict[str, Any]) -> 'StatusMessage':
+    def FromString(cls, data: bytes) -> 'StatusMessage':
+        fields = dict(_parse_fields(data))
         return cls(
-            type=StatusType(data["type"]),
-            message=data["message"],
-            code=data.get("code", 0)
+            type=StatusType(fields.get(1, 0)),
+            message=str(fields.get(2, b''), 'utf-8'),
+            code=_to_int32(fields.get(3, 0))
         )
 
 
+# Field number and name of each member of VideoMessage's payload oneof
+_PAYLOAD_FIELDS = {
+    VideoFrame: (1, 'video_frame'),
+    AudioFrame: (2, 'audio_frame'),
+    ControlMessage: (3, 'control'),
+    StatusMessage: (4, 'status'),
+}
+_PAYLOAD_TYPES = {number: cls for cls, (number, _) in _PAYLOAD_FIELDS.items()}
+
+
 @dataclass
 class VideoMessage:
     payload: Union[VideoFrame, AudioFrame, ControlMessage, StatusMessage]
     timestamp: int = 0
-    
+
     def __post_init__(self):
         if self.timestamp == 0:
             self.timestamp = int(time.time() * 1000)
-    
-    def to_dict(self) -> Dict[str, Any]:
-        payload_type = type(self.payload).__name__
-        payload_dict = self.payload.to_dict()
-        
-        return {
-            "payload_type": payload_type,
-            "payload": payload_dict,
-            "timestamp": self.timestamp
-        }
-    
+
+    def WhichOneof(self, oneof_group: str) -> str:
+        if oneof_group != 'payload':
+            raise ValueError(f"Unknown oneof: {oneof_group}")
+        return _PAYLOAD_FIELDS[type(self.payload)][1]
+
+    def SerializeToString(self) -> bytes:
+        return b''.join(self.SerializeToParts())
+
+    def SerializeToParts(self) -> List:
+        """
+        Serialize the message as a list of buffers to be sent in order.
+
+        Frame data is included as the original object rather than copied,
+        so the message can be written out without building one big buffer.
+
+        Returns:
+            list: bytes-like parts whose concatenation is the message
+        """
+        number = _PAYLOAD_FIELDS[type(self.payload)][0]
+        parts = self.payload.SerializeToParts()
+        size = sum(map(len, parts))
+
+        # The payload is always written, even when empty, so the receiver
+        # can tell which member of the oneof is set
+        return [
+            _key(number, _LENGTH_DELIMITED) + _encode_varint(size),
+            *parts,
+            _varint_field(5, self.timestamp)
+        ]
+
     @classmethod
-    def from_dict(cls, data: Dict[str, Any]) -> 'VideoMessage':
-        payload_type = data["payload_type"]
-        payload_data = data["payload"]
-        
-        if payload_type == "VideoFrame":
-            payload = VideoFrame.from_dict(payload_data)
-        elif payload_type == "AudioFrame":
-            payload = AudioFrame.from_dict(payload_data)
-        elif payload_type == "ControlMessage":
-            payload = ControlMessage.from_dict(payload_data)
-        elif payload_type == "StatusMessage":
-            payload = StatusMessage.from_dict(payload_data)
-        else:
-            raise ValueError(f"Unknown payload type: {payload_type}")
-        
+    def FromString(cls, data: bytes) -> 'VideoMessage':
+        payload = None
+        timestamp = 0
+        for number, value in _parse_fields(data):
+            if number in _PAYLOAD_TYPES:
+                payload = _PAYLOAD_TYPES[number].FromString(value)
+            elif number == 5:
+                timestamp = value
+
+        if payload is None:
+            raise ValueError("Message has no payload")
+
         return cls(
             payload=payload,
-            timestamp=data["timestamp"]
-        ) 
\ No newline at end of file
+            timestamp=timestamp
+        )
@@ -0,0 +1,123 @@
+"""
+Compiled video kernels for the video chat application.
+
+The kernels need the optional numba package; when it is not installed they
+are None and callers fall back to their OpenCV implementations.
+"""
+
+import numpy as np
+
+try:
+    from numba import njit, prange
+except ImportError:
+    njit = None
+
+
+# Bilinear weights are fixed point with this many fractional bits
+_WEIGHT_BITS = 11
+
+
+if njit is not None:
+    @njit(parallel=True, cache=True)
+    def bgr_resize_rgb(src, dst):
+        """
+        Resize a BGR image and convert it to RGB in a single pass.
+
+        Pixels are bilinearly interpolated using the same pixel-centre
+        alignment as cv2.INTER_LINEAR, and the channel order is swapped as
+        each pixel is written.
+
+        Args:
+            src: Source image as a (height, width, 3) uint8 array in BGR order
+            dst: Output image as a (height, width, 3) uint8 array, written in
+                 RGB order
+        """
+        src_height, src_width = src.shape[0], src.shape[1]
+        dst_height, dst_width = dst.shape[0], dst.shape[1]
+        one = 1 << _WEIGHT_BITS
+        shift = 2 * _WEIGHT_BITS
+        half = 1 << (shift - 1)
+
+        # Source columns and weights are the same for every row
+        lefts = np.empty(dst_width, np.int64)
+        rights = np.empty(dst_width, np.int64)
+        weights = np.empty(dst_width, np.int32)
+        scale_x = src_width / dst_width
+        for x in range(dst_width):
+            sx = max((x + 0.5) * scale_x - 0.5, 0.0)
+            left = min(int(sx), src_width - 1)
+            lefts[x] = left
+            rights[x] = min(left + 1, src_width - 1)
+            weights[x] = int((sx - left) * one + 0.5)
+
+        scale_y = src_height / dst_height
+        for y in prange(dst_height):
+            sy = max((y + 0.5) * scale_y - 0.5, 0.0)
+            top = min(int(sy), src_height - 1)
+            bottom = min(top + 1, src_height - 1)
+            fy = int((sy - top) * one + 0.5)
+
+            for x in range(dst_width):
+                left = lefts[x]
+                right = rights[x]
+                fx = weights[x]
+                for c in range(3):
+                    upper = (np.int32(src[top, left, c]) * (one - fx)
+                             + np.int32(src[top, right, c]) * fx)
+                    lower = (np.int32(src[bottom, left, c]) * (one - fx)
+                             + np.int32(src[bottom, right, c]) * fx)
+                    dst[y, x, 2 - c] = (upper * (one - fy) + lower * fy
+                                        + half) >> shift
+
+    @njit(parallel=True, cache=True)
+    def nn_resize(src, dst, swap):
+        """
+        Resize an image with nearest-neighbour sampling in a single pass.
+
+        This is meant for small thumbnails, where interpolating isn't worth
+        its cost. The channel order can be swapped (BGR to RGB or back) as
+        each pixel is written.
+
+        Args:
+            src: Source image as a (height, width, 3) uint8 array
+            dst: Output image as a (height, width, 3) uint8 array
+            swap: If True, reverse the channel order
+        """
+        src_height, src_width = src.shape[0], src.shape[1]
+        dst_height, dst_width = dst.shape[0], dst.shape[1]
+
+        # Source columns are the same for every row
+        columns = np.empty(dst_width, np.int64)
+        for x in range(dst_width):
+            columns[x] = x * src_width // dst_width
+
+        for y in prange(dst_height):
+            sy = y * src_height // dst_height
+            for x in range(dst_width):
+                sx = columns[x]
+                if swap:
+                    dst[y, x, 0] = src[sy, sx, 2]
+                    dst[y, x, 1] = src[sy, sx, 1]
+                    dst[y, x, 2] = src[sy, sx, 0]
+                else:
+                    dst[y, x, 0] = src[sy, sx, 0]
+                    dst[y, x, 1] = src[sy, sx, 1]
+                    dst[y, x, 2] = src[sy, sx, 2]
+else:
+    bgr_resize_rgb = None
+    nn_resize = None
+
+
+def precompile():
+    """
+    Compile the kernels ahead of their first real use.
+
+    Compiling happens on the first call (or loads from numba's cache), so
+    running this at startup keeps that delay off the first displayed frame.
+    """
+    if bgr_resize_rgb is not None:
+        bgr_resize_rgb(np.zeros((64, 64, 3), dtype=np.uint8),
+                       np.zeros((48, 64, 3), dtype=np.uint8))
+    if nn_resize is not None:
+        nn_resize(np.zeros((64, 64, 3), dtype=np.uint8),
+                  np.zeros((16, 16, 3), dtype=np.uint8), True)
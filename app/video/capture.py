@@ -1,9 +1,61 @@
 import cv2
+import numpy as np
+import sys
 import threading
 import time
 from PIL import Image
 import customtkinter as ctk
 
+from app.video._fastpath import nn_resize
+from app.video.color import bgr2rgb
+from app.video.frame_ring import FrameRing
+
+
+# Camera backend for this platform; opening with an explicit backend skips
+# OpenCV trying each backend in turn, which can take seconds on Windows
+_BACKEND = {
+    'win32': cv2.CAP_DSHOW,
+    'linux': cv2.CAP_V4L2,
+    'darwin': cv2.CAP_AVFOUNDATION,
+}.get(sys.platform, cv2.CAP_ANY)
+
+
+def resize_interpolation(frame, size):
+    """
+    Pick the OpenCV interpolation for resizing a frame.
+    
+    INTER_AREA averages the source pixels, avoiding moire when shrinking,
+    and takes a fast box-filter path for integer ratios; when enlarging it
+    offers nothing over the cheaper INTER_LINEAR.
+    
+    Args:
+        frame: Video frame to be resized
+        size: Target (width, height)
+        
+    Returns:
+        int: cv2.INTER_AREA when shrinking, cv2.INTER_LINEAR otherwise
+    """
+    if size[0] < frame.shape[1] or size[1] < frame.shape[0]:
+        return cv2.INTER_AREA
+    return cv2.INTER_LINEAR
+
+
+def _open_camera(device_id):
+    """
+    Open a camera with the platform's backend, falling back to any backend.
+    
+    Args:
+        device_id: Camera device ID
+        
+    Returns:
+        cv2.VideoCapture: The capture, which may not be opened
+    """
+    cap = cv2.VideoCapture(device_id, _BACKEND)
+    if not cap.isOpened() and _BACKEND != cv2.CAP_ANY:
+        cap.release()
+        cap = cv2.VideoCapture(device_id, cv2.CAP_ANY)
+    return cap
+
 
 class VideoCapture:
     """
@@ -14,7 +66,10 @@ class VideoCapture:
         Initialize the video capture.
         
         Args:
-            callback: Optional callback function to be called with each frame
+            callback: Optional callback function to be called with each
+                      frame in RGB. The frame is a buffer reused for the
+                      next one, so the callback must copy it if it keeps it
+                      after returning.
         """
         self.cap = None
         self.is_running = False
@@ -23,12 +78,35 @@ class VideoCapture:
         self.frame_size = (640, 480)
         self.device_id = device_id
         
-    def start(self, device_id=0):
+        # Ring of preallocated frames each captured frame is stored into in
+        # BGR, as the encoder takes it, and buffer the frame is converted to
+        # RGB into for the callback; both are reused while the frame size
+        # stays the same. Another thread can take the newest frame from the
+        # ring with frames.latest().
+        self.frames = None
+        self._rgb_buf = None
+        
+        # CTkImage returned by get_ctk_image(), reused for every frame, and
+        # buffer its thumbnails are scaled into
+        self._ctk_img = None
+        self._thumb_buf = None
+        
+        # Frame period in seconds, from the camera's frame rate once started
+        self._frame_dt = 1.0 / 30.0
+        
+        # Resize and convert frames that need resizing on the GPU through
+        # OpenCL; off by default, since uploading and downloading the frames
+        # costs more than it saves below about 1080p
+        self.use_opencl = False
+        self._use_umat = False
+        
+    def start(self, device_id=None):
         """
         Start capturing video from the specified device.
         
         Args:
-            device_id: Camera device ID (default: 0 for primary webcam)
+            device_id: Camera device ID (default: None for the device given
+                       when the capture was created)
             
         Returns:
             bool: True if started successfully, False otherwise
@@ -36,10 +114,33 @@ class VideoCapture:
         if self.is_running:
             return True
             
-        self.cap = cv2.VideoCapture(device_id)
+        if device_id is None:
+            device_id = self.device_id
+        self.cap = _open_camera(device_id)
         if not self.cap.isOpened():
             return False
             
+        # Keep only the newest frame in the driver's queue, so frames
+        # aren't read late after a slow iteration
+        self.cap.set(cv2.CAP_PROP_BUFFERSIZE, 1)
+        
+        # Ask the driver for frames at the target size, so they usually
+        # don't need resizing, and for MJPG so the camera can deliver that
+        # size at full frame rate over USB
+        self.cap.set(cv2.CAP_PROP_FOURCC, cv2.VideoWriter_fourcc(*'MJPG'))
+        self.cap.set(cv2.CAP_PROP_FRAME_WIDTH, self.frame_size[0])
+        self.cap.set(cv2.CAP_PROP_FRAME_HEIGHT, self.frame_size[1])
+        
+        # Pace the capture loop by the camera's frame rate; some drivers
+        # report 0, so assume 30 FPS then
+        fps = self.cap.get(cv2.CAP_PROP_FPS)
+        self._frame_dt = 1.0 / (fps if fps > 0 else 30.0)
+        
+        # Only use OpenCL if there is a working OpenCL device
+        self._use_umat = self.use_opencl and cv2.ocl.haveOpenCL()
+        if self._use_umat:
+            cv2.ocl.setUseOpenCL(True)
+        
         self.is_running = True
         self.video_thread = threading.Thread(target=self._update)
         self.video_thread.daemon = True
@@ -68,20 +169,61 @@ class VideoCapture:
         Internal method to continuously update frames.
         """
         while self.is_running:
-            ret, frame = self.cap.read()
+            deadline = time.monotonic() + self._frame_dt
+            
+            # Read the frame in BGR straight into the next slot of the ring
+            # for the encoder
+            width, height = self.frame_size
+            if self.frames is None or self.frames.shape != (height, width, 3):
+                self.frames = FrameRing((height, width, 3))
+                self._rgb_buf = np.empty((height, width, 3), dtype=np.uint8)
+            slot = self.frames.next_slot()
+            ret, frame = self.cap.read(slot)
             if not ret:
                 break
                 
-            # Convert the frame to RGB (from BGR)
-            frame = cv2.cvtColor(frame, cv2.COLOR_BGR2RGB)
-            frame = cv2.resize(frame, self.frame_size)
+            # Frames the driver delivers at another size come back in a new
+            # array, so resize those into the slot, then convert the frame
+            # to RGB for display into the reused buffer
+            if frame is not slot and self._use_umat:
+                frame = self._resize_convert_umat(frame, slot)
+                self.frames.publish()
+            else:
+                bgr = slot if frame is slot else self._resize(frame, dst=slot)
+                self.frames.publish()
+                frame = bgr2rgb(bgr, self._rgb_buf)
             
             # If a callback is provided, call it with the frame
             if self.callback:
                 self.callback(frame)
                 
-            time.sleep(0.03)  # ~30 FPS
+            # read() normally blocks until the camera delivers the next
+            # frame, so only sleep if it returned early
+            slack = deadline - time.monotonic()
+            if slack > 0.001:
+                time.sleep(slack)
             
+    def _resize_convert_umat(self, frame, dst):
+        """
+        Resize a frame and convert it to RGB on the GPU through OpenCL.
+        
+        OpenCV queues the GPU work, so only the downloads wait for it.
+        
+        Args:
+            frame: Captured frame in BGR
+            dst: Array of the frame size to write the resized BGR frame into
+            
+        Returns:
+            numpy.ndarray: The resized frame in RGB, in the reused buffer
+        """
+        bgr = cv2.resize(cv2.UMat(frame), self.frame_size,
+                         interpolation=resize_interpolation(frame,
+                                                            self.frame_size))
+        rgb = cv2.cvtColor(bgr, cv2.COLOR_BGR2RGB)
+        np.copyto(dst, bgr.get())
+        np.copyto(self._rgb_buf, rgb.get())
+        return self._rgb_buf
+        
     def get_frame(self):
         """
         Get the current frame from the camera.
@@ -89,36 +231,122 @@ class VideoCapture:
         Returns:
             numpy.ndarray or None: The current frame if available, None otherwise
         """
+        frame = self._read_bgr()
+        if frame is None:
+            return None
+            
+        return cv2.cvtColor(self._resize(frame), cv2.COLOR_BGR2RGB)
+        
+    def _read_bgr(self):
+        """
+        Read a frame from the camera as delivered, in BGR.
+        
+        Returns:
+            numpy.ndarray or None: The frame if available, None otherwise
+        """
         if not self.is_running or not self.cap:
             return None
             
         ret, frame = self.cap.read()
-        if not ret:
-            return None
+        return frame if ret else None
+        
+    def _resize(self, frame, dst=None):
+        """
+        Resize a frame to the frame size, unless it already has that size.
+        
+        Args:
+            frame: Captured frame
+            dst: Optional array of the frame size to write the result into
             
-        frame = cv2.cvtColor(frame, cv2.COLOR_BGR2RGB)
-        frame = cv2.resize(frame, self.frame_size)
-        return frame
+        Returns:
+            numpy.ndarray: The frame at the frame size (dst if given)
+        """
+        if (frame.shape[1], frame.shape[0]) == self.frame_size:
+            if dst is None:
+                return frame
+            np.copyto(dst, frame)
+            return dst
+        return cv2.resize(frame, self.frame_size, dst=dst,
+                          interpolation=resize_interpolation(frame,
+                                                             self.frame_size))
         
-    def get_ctk_image(self, frame=None):
+    def get_ctk_image(self, frame=None, size=None):
         """
         Convert a frame to a CTkImage for use with CustomTkinter.
         
         Args:
-            frame: Optional frame to convert. If None, gets the current frame.
+            frame: Optional RGB frame to convert. If None, gets the current
+                   frame.
+            size: Optional (width, height) to scale the image to, such as a
+                  thumbnail size. Scaling uses nearest-neighbour sampling
+                  into a buffer reused by the next call.
             
         Returns:
-            ctk.CTkImage or None: The converted image if available
+            ctk.CTkImage or None: The converted image if available. The same
+            CTkImage is returned by every call, updated with the new frame.
         """
-        if frame is None:
-            frame = self.get_frame()
+        if size is not None and size != self.frame_size:
+            # Scale the current frame straight from BGR when there is no
+            # frame given, converting it while scaling
+            swap = frame is None
+            if swap:
+                frame = self._read_bgr()
+            if frame is None:
+                return None
+            frame = self._thumbnail(frame, size, swap)
+        else:
+            size = self.frame_size
+            if frame is None:
+                frame = self.get_frame()
             
         if frame is None:
             return None
             
-        img = Image.fromarray(frame)
-        return ctk.CTkImage(light_image=img, dark_image=img, 
-                           size=(self.frame_size[0], self.frame_size[1]))
+        # PIL unpacks the pixels into its own 4-byte-per-pixel storage, so
+        # this copies the frame once; frombuffer reads the array's memory
+        # directly, which must be contiguous
+        if not frame.flags['C_CONTIGUOUS']:
+            frame = np.ascontiguousarray(frame)
+        height, width = frame.shape[:2]
+        img = Image.frombuffer('RGB', (width, height), frame, 'raw', 'RGB', 0, 1)
+        
+        # Reuse one CTkImage, giving both appearance modes the same image
+        if self._ctk_img is None:
+            self._ctk_img = ctk.CTkImage(light_image=img, dark_image=img,
+                                         size=size)
+        else:
+            self._ctk_img.configure(light_image=img, dark_image=img,
+                                    size=size)
+        return self._ctk_img
+        
+    def _thumbnail(self, frame, size, swap):
+        """
+        Scale a frame with nearest-neighbour sampling into the reused
+        thumbnail buffer.
+        
+        Args:
+            frame: Frame to scale
+            size: Target (width, height)
+            swap: If True, also convert the frame from BGR to RGB
+            
+        Returns:
+            numpy.ndarray: The scaled frame
+        """
+        width, height = size
+        if (self._thumb_buf is None
+                or self._thumb_buf.shape[:2] != (height, width)):
+            self._thumb_buf = np.empty((height, width, 3), dtype=np.uint8)
+            
+        if nn_resize is not None:
+            # Sample and swap channels in one compiled pass
+            nn_resize(frame, self._thumb_buf, swap)
+        elif swap:
+            bgr2rgb(cv2.resize(frame, size, interpolation=cv2.INTER_NEAREST),
+                    self._thumb_buf)
+        else:
+            cv2.resize(frame, size, dst=self._thumb_buf,
+                       interpolation=cv2.INTER_NEAREST)
+        return self._thumb_buf
         
     def set_frame_size(self, width, height):
         """
@@ -149,7 +377,7 @@ class VideoCapture:
         available_devices = []
         # Check the first 10 camera indices
         for i in range(10):
-            cap = cv2.VideoCapture(i)
+            cap = cv2.VideoCapture(i, _BACKEND)
             if cap.isOpened():
                 # Get device name if possible, otherwise use a generic name
                 try:
@@ -0,0 +1,51 @@
+"""
+Colour conversion for the video chat application.
+
+OpenCV's colour conversions are fastest when its SIMD code is built for the
+CPU's wider vector units. Builds without them still run the conversion with
+their baseline SIMD code, which is far faster than any numpy equivalent, so
+a missing wide SIMD build is only reported.
+"""
+
+import logging
+
+import cv2
+
+
+def _has_wide_simd():
+    """
+    Check whether OpenCV was built with AVX2 or NEON code.
+
+    Returns:
+        bool: True if the build has AVX2 (x86) or NEON (ARM) code paths
+    """
+    # The baseline and dispatched instruction sets are listed under the
+    # CPU/HW features section of the build information
+    info = cv2.getBuildInformation()
+    start = info.find('CPU/HW features:')
+    if start < 0:
+        return False
+    features = info[start:info.find('\n\n', start)]
+    return 'AVX2' in features or 'NEON' in features
+
+
+# Whether OpenCV was built with wide SIMD code for this kind of CPU
+OPENCV_SIMD = _has_wide_simd()
+
+if not OPENCV_SIMD:
+    logging.warning("OpenCV was built without AVX2/NEON code, "
+                    "colour conversion will be slower")
+
+
+def bgr2rgb(src, dst):
+    """
+    Convert a BGR image to RGB.
+
+    Args:
+        src: Image as a (height, width, 3) uint8 array in BGR order
+        dst: Array of the same shape to write the RGB image into
+
+    Returns:
+        numpy.ndarray: dst
+    """
+    return cv2.cvtColor(src, cv2.COLOR_BGR2RGB, dst=dst)
@@ -3,9 +3,29 @@ Video encoder/decoder module for the video chat application.
 """
 
 import cv2
+import inspect
 import numpy as np
 import logging
-from typing import Tuple, Optional
+import zlib
+from typing import Tuple, Optional, Union
+
+from app.video.color import bgr2rgb
+
+try:
+    from turbojpeg import TurboJPEG, TJPF_BGR, TJSAMP_420
+except ImportError:
+    # Optional: without PyTurboJPEG frames are encoded with OpenCV
+    TurboJPEG = None
+
+try:
+    import xxhash
+except ImportError:
+    # Optional: without xxhash frames are fingerprinted with zlib's CRC-32
+    xxhash = None
+
+
+# Encoded frame data: bytes from libjpeg-turbo or a view of OpenCV's buffer
+_EncodedData = Union[bytes, memoryview]
 
 
 class VideoEncoder:
@@ -28,6 +48,44 @@ class VideoEncoder:
         self.encoding = encoding
         self.quality = quality
         
+        # OpenCV JPEG parameters, built once instead of for every frame
+        self._encode_param = self._jpeg_params()
+        
+        # Buffer RGB frames are decoded into, reused while the size matches
+        self._rgb_buf = None
+        
+        # Buffer libjpeg-turbo decodes BGR frames into, likewise reused
+        self._dec_buf = None
+        
+        # libjpeg-turbo handle, shared by every encode and decode call
+        self._tj = None
+        if TurboJPEG is not None:
+            try:
+                self._tj = TurboJPEG()
+            except Exception as e:
+                # The Python package is installed but not the C library
+                logging.warning(f"libjpeg-turbo not available, using OpenCV: {e}")
+                
+        # Older PyTurboJPEG releases can't decode into an existing array
+        self._tj_decode_dst = (
+            self._tj is not None
+            and 'dst' in inspect.signature(self._tj.decode).parameters
+        )
+        
+        # Hand libjpeg-turbo ready-made 4:2:0 YCbCr planes instead of BGR
+        # pixels; off by default, since it only pays off where OpenCV's
+        # conversion is faster than libjpeg-turbo's own
+        self.yuv_input = False
+        
+        # Conversion buffers for YUV input, reused while the size matches
+        self._ycc_buf = None
+        self._half_buf = None
+        self._yuv_buf = None
+        
+        # Fingerprint of the last encoded frame and its encoded data, so
+        # a frame that hasn't changed is sent again without encoding it
+        self._last_encoded = None
+        
         # For H.264 encoding
         if self.encoding == self.H264:
             # Try to use hardware acceleration if available
@@ -39,7 +97,7 @@ class VideoEncoder:
                 self.codec = cv2.VideoWriter_fourcc(*'X264')
                 self.encoder = cv2.VideoWriter_fourcc(*'X264')
         
-    def encode_frame(self, frame: np.ndarray) -> Tuple[bytes, int, int]:
+    def encode_frame(self, frame: np.ndarray) -> Tuple[_EncodedData, int, int]:
         """
         Encode a video frame.
         
@@ -48,29 +106,167 @@ class VideoEncoder:
             
         Returns:
             Tuple containing:
-                - Encoded frame data as bytes
+                - Encoded frame data as bytes, or a byte memoryview of
+                  memory owned by that result alone
                 - Frame width
                 - Frame height
         """
         height, width = frame.shape[:2]
         
+        # Reuse the last encoded data if the frame looks the same
+        key = self._fingerprint(frame)
+        last = self._last_encoded
+        if last is not None and last[0] == key:
+            return last[1], width, height
+        
         if self.encoding == self.JPEG:
             # JPEG encoding
-            encode_param = [int(cv2.IMWRITE_JPEG_QUALITY), self.quality]
-            _, encoded_frame = cv2.imencode('.jpg', frame, encode_param)
-            return encoded_frame.tobytes(), width, height
+            encoded = self._encode_jpeg(frame)
         elif self.encoding == self.H264:
             # H.264 encoding (simplified)
             # In a real application, you would use a proper H.264 encoder
             # This is a simplified version using JPEG as a fallback
-            encode_param = [int(cv2.IMWRITE_JPEG_QUALITY), self.quality]
-            _, encoded_frame = cv2.imencode('.jpg', frame, encode_param)
-            return encoded_frame.tobytes(), width, height
+            encoded = self._encode_jpeg(frame)
         else:
             raise ValueError(f"Unsupported encoding format: {self.encoding}")
+            
+        self._last_encoded = (key, encoded)
+        return encoded, width, height
+        
+    def _fingerprint(self, frame: np.ndarray) -> tuple:
+        """
+        Fingerprint a frame to tell whether it changed since the last one.
+        
+        The frame is hashed at 32x32, averaged down with INTER_AREA, which
+        costs a small fraction of an encode.
+        
+        Args:
+            frame: Video frame as a numpy array (BGR format)
+            
+        Returns:
+            tuple: Hash of the frame with its shape, quality and encoding
+        """
+        thumb = cv2.resize(frame, (32, 32), interpolation=cv2.INTER_AREA)
+        if xxhash is not None:
+            digest = xxhash.xxh3_64_intdigest(thumb)
+        else:
+            digest = zlib.crc32(thumb)
+        return digest, frame.shape, self.quality, self.encoding
+        
+    def _jpeg_params(self):
+        """
+        Build the parameter list for cv2.imencode at the current quality.
+        
+        Huffman table optimization and progressive mode are turned off;
+        both need extra passes over the image and only save a few bytes.
+        
+        Returns:
+            list: Parameters for JPEG encoding
+        """
+        return [
+            int(cv2.IMWRITE_JPEG_QUALITY), int(self.quality),
+            int(cv2.IMWRITE_JPEG_OPTIMIZE), 0,
+            int(cv2.IMWRITE_JPEG_PROGRESSIVE), 0
+        ]
+        
+    def _encode_jpeg(self, frame: np.ndarray) -> _EncodedData:
+        """
+        Encode a frame as JPEG, with libjpeg-turbo when available.
+        
+        Args:
+            frame: Video frame as a numpy array (BGR format)
+            
+        Returns:
+            Encoded frame data as bytes, or a byte memoryview from OpenCV
+        """
+        if self._tj is not None:
+            height, width = frame.shape[:2]
+            if (self.yuv_input and not (width | height) & 1
+                    and hasattr(self._tj, 'encode_from_yuv')):
+                return self._tj.encode_from_yuv(
+                    self._to_yuv420(frame), height, width,
+                    quality=self.quality, jpeg_subsample=TJSAMP_420
+                )
+            return self._tj.encode(frame, quality=self.quality,
+                                   pixel_format=TJPF_BGR,
+                                   jpeg_subsample=TJSAMP_420)
+            
+        if self._encode_param[1] != self.quality:
+            self._encode_param = self._jpeg_params()
+        _, encoded_frame = cv2.imencode('.jpg', frame, self._encode_param)
+        
+        # imencode returns a new array each time, so the data can be passed
+        # on as a view of it rather than copied out
+        return memoryview(encoded_frame).cast('B')
+        
+    def _to_yuv420(self, frame: np.ndarray) -> np.ndarray:
+        """
+        Convert a BGR frame to planar 4:2:0 YCbCr for libjpeg-turbo.
+        
+        JPEG uses full-range YCbCr, unlike OpenCV's I420 conversion, so the
+        frame is converted to full-range YCrCb and the chroma planes are
+        averaged down to half size.
+        
+        Args:
+            frame: Video frame with even dimensions (BGR format)
+            
+        Returns:
+            numpy.ndarray: Y, Cb and Cr planes one after another, in a
+            buffer reused by the next call
+        """
+        height, width = frame.shape[:2]
+        if self._ycc_buf is None or self._ycc_buf.shape != frame.shape:
+            self._ycc_buf = np.empty_like(frame)
+            self._half_buf = np.empty((height // 2, width // 2, 3),
+                                      dtype=np.uint8)
+            self._yuv_buf = np.empty(height * width * 3 // 2, dtype=np.uint8)
+            
+        ycc = cv2.cvtColor(frame, cv2.COLOR_BGR2YCrCb, dst=self._ycc_buf)
+        half = cv2.resize(ycc, (width // 2, height // 2), dst=self._half_buf,
+                          interpolation=cv2.INTER_AREA)
+        
+        # Lay the planes out in Y, Cb, Cr order
+        luma = height * width
+        chroma = luma // 4
+        yuv = self._yuv_buf
+        np.copyto(yuv[:luma].reshape(height, width), ycc[:, :, 0])
+        np.copyto(yuv[luma:luma + chroma].reshape(height // 2, width // 2),
+                  half[:, :, 2])
+        np.copyto(yuv[luma + chroma:].reshape(height // 2, width // 2),
+                  half[:, :, 1])
+        return yuv
+        
+    def _decode_jpeg(self, encoded_data: bytes) -> Optional[np.ndarray]:
+        """
+        Decode JPEG data, with libjpeg-turbo when available.
+        
+        Args:
+            encoded_data: Encoded frame data
+            
+        Returns:
+            Decoded frame as a numpy array (BGR format), or None if the data
+            couldn't be decoded. With libjpeg-turbo the frame is a buffer
+            overwritten by the next decode.
+        """
+        if self._tj_decode_dst:
+            # Decode into the reused buffer, sized from the JPEG header
+            # rather than the sender's claimed size
+            width, height = self._tj.decode_header(encoded_data)[:2]
+            if (self._dec_buf is None
+                    or self._dec_buf.shape[:2] != (height, width)):
+                self._dec_buf = np.empty((height, width, 3), dtype=np.uint8)
+            self._tj.decode(encoded_data, pixel_format=TJPF_BGR,
+                            dst=self._dec_buf)
+            return self._dec_buf
+            
+        if self._tj is not None:
+            return self._tj.decode(encoded_data, pixel_format=TJPF_BGR)
+            
+        frame_array = np.frombuffer(encoded_data, dtype=np.uint8)
+        return cv2.imdecode(frame_array, cv2.IMREAD_COLOR)
     
     def decode_frame(self, encoded_data: bytes, width: int, height: int, 
-                    encoding: str) -> Optional[np.ndarray]:
+                    encoding: str, out_format: str = 'bgr') -> Optional[np.ndarray]:
         """
         Decode an encoded video frame.
         
@@ -79,24 +275,35 @@ class VideoEncoder:
             width: Frame width
             height: Frame height
             encoding: Encoding format
+            out_format: Channel order of the result, 'bgr' (default) or
+                        'rgb'. RGB frames are converted into a buffer owned
+                        by the encoder, which is overwritten by the next
+                        RGB decode; BGR frames decoded by libjpeg-turbo are
+                        likewise overwritten by the next decode.
             
         Returns:
-            Decoded frame as a numpy array (BGR format), or None if decoding fails
+            Decoded frame as a numpy array, or None if decoding fails
         """
         try:
             if encoding == self.JPEG:
                 # JPEG decoding
-                frame_array = np.frombuffer(encoded_data, dtype=np.uint8)
-                return cv2.imdecode(frame_array, cv2.IMREAD_COLOR)
+                frame = self._decode_jpeg(encoded_data)
             elif encoding == self.H264:
                 # H.264 decoding (simplified)
                 # In a real application, you would use a proper H.264 decoder
                 # This is a simplified version using JPEG as a fallback
-                frame_array = np.frombuffer(encoded_data, dtype=np.uint8)
-                return cv2.imdecode(frame_array, cv2.IMREAD_COLOR)
+                frame = self._decode_jpeg(encoded_data)
             else:
                 logging.error(f"Unsupported encoding format: {encoding}")
                 return None
+                
+            if frame is None or out_format != 'rgb':
+                return frame
+                
+            # Convert into the reusable RGB buffer
+            if self._rgb_buf is None or self._rgb_buf.shape != frame.shape:
+                self._rgb_buf = np.empty_like(frame)
+            return bgr2rgb(frame, self._rgb_buf)
         except Exception as e:
             logging.error(f"Error decoding frame: {e}")
-            return None 
\ No newline at end of file
+            return None
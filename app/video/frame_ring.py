@@ -0,0 +1,103 @@
+"""
+Ring buffer used to hand captured video frames to the encoder thread.
+"""
+
+import numpy as np
+
+
+class FrameRing:
+    """
+    Single-producer/single-consumer ring of preallocated video frames.
+
+    The producer writes each frame into a free slot and publishes it as the
+    latest frame; the consumer only ever wants the newest frame, which it
+    holds while using it. The producer never writes into the latest or the
+    held slot, so neither side takes a lock, the producer never blocks, and
+    frames the consumer didn't get to are simply overwritten.
+    """
+
+    def __init__(self, shape, capacity=4, dtype=np.uint8):
+        """
+        Initialize the ring.
+
+        Args:
+            shape: Shape of each frame, such as (height, width, 3)
+            capacity: Number of slots, must be a power of two and at least 4
+                      (default: 4)
+            dtype: Pixel data type of the slots (default: uint8)
+        """
+        if capacity < 4 or capacity & (capacity - 1):
+            raise ValueError(f"Ring capacity must be a power of two of at "
+                             f"least 4: {capacity}")
+
+        self.shape = tuple(shape)
+        self.dtype = np.dtype(dtype)
+        self.capacity = capacity
+        self._mask = capacity - 1
+
+        # All slots are allocated up front so capturing never allocates
+        self._slots = [np.empty(shape, dtype=dtype) for _ in range(capacity)]
+
+        self._count = 0     # Frames published, written by the producer only
+        self._latest = -1   # Slot of the newest frame, producer only
+        self._write = 0     # Slot the next frame goes into, producer only
+        self._taken = 0     # Value of _count last taken, consumer only
+        self._held = -1     # Slot the consumer is using, consumer only
+
+    def next_slot(self):
+        """
+        Get the slot the next frame should be written into (producer side).
+
+        Returns:
+            numpy.ndarray: Free slot, published by ``publish()``
+        """
+        index = self._write
+        while index == self._latest or index == self._held:
+            index = (index + 1) & self._mask
+        self._write = index
+        return self._slots[index]
+
+    def publish(self):
+        """
+        Make the slot from ``next_slot()`` the latest frame (producer side).
+        """
+        index = self._write
+
+        # Publish the slot only once it is fully written
+        self._latest = index
+        self._count += 1
+        self._write = (index + 1) & self._mask
+
+    def latest(self):
+        """
+        Take the newest frame if it hasn't been taken yet (consumer side).
+
+        The returned array is a slot of the ring, which the producer leaves
+        alone until ``release()`` is called.
+
+        Returns:
+            numpy.ndarray or None: The newest frame, or None if there is no
+            new frame
+        """
+        if self._count == self._taken:
+            return None
+
+        # Hold the slot, then check it is still the latest; if the producer
+        # published in between, it may already be writing into the slot, so
+        # try again with the newer one until the held slot is the latest
+        while True:
+            index = self._latest
+            self._held = index
+            if self._latest == index:
+                break
+
+        # Count the frames only once the slot is settled, so the count
+        # taken covers the frame returned
+        self._taken = self._count
+        return self._slots[index]
+
+    def release(self):
+        """
+        Release the frame returned by ``latest()`` (consumer side).
+        """
+        self._held = -1
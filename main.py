@@ -1,10 +1,16 @@
 import sys
 import os
-from app.gui.main_window import MainWindow
 
 # Add the current directory to the path so we can import our modules
 sys.path.append(os.path.dirname(os.path.abspath(__file__)))
 
 if __name__ == "__main__":
+    # Prefer AVFoundation on macOS; OpenCV reads this when it is imported
+    if sys.platform == 'darwin':
+        os.environ.setdefault('OPENCV_VIDEOIO_PRIORITY_AVFOUNDATION', '100')
+        
+    # Import the GUI only when run, so importing this module stays cheap
+    from app.gui.main_window import MainWindow
+    
     app = MainWindow()
     app.run() 
\ No newline at end of file
@@ -8,7 +8,6 @@ This script launches the video chat application.
 import sys
 import os
 import logging
-from app.gui.main_window import MainWindow
 
 # Configure logging
 logging.basicConfig(
@@ -25,7 +24,15 @@ sys.path.append(os.path.dirname(os.path.abspath(__file__)))
 
 def main():
     """Main entry point for the application"""
+    # Prefer AVFoundation on macOS; OpenCV reads this when it is imported
+    if sys.platform == 'darwin':
+        os.environ.setdefault('OPENCV_VIDEOIO_PRIORITY_AVFOUNDATION', '100')
+        
     try:
+        # Import the GUI here rather than at the top, so importing this
+        # module stays cheap and missing dependencies are logged below
+        from app.gui.main_window import MainWindow
+        
         # Create and run the main window
         app = MainWindow()
         app.run()